@@ -1,12 +1,13 @@
-import json
 import os
 import struct
 
 import bpy
-from bpy.props import StringProperty
+from bpy.props import BoolProperty, IntProperty, StringProperty
 from bpy_extras.io_utils import ImportHelper
 
-from io_scene_gltf import animation, buffer, material, mesh, node
+from io_scene_gltf import (
+    accessor_cache, animation, buffer, datauri, liveness, material, mesh, node, profiling, reachability,
+)
 
 bl_info = {
     'name': 'glTF 2.0 Importer',
@@ -23,7 +24,7 @@ bl_info = {
 # Supported glTF version
 GLTF_VERSION = (2, 0)
 # Supported extensions
-EXTENSIONS = set()
+EXTENSIONS = set(['EXT_mesh_gpu_instancing'])
 
 
 class ImportGLTF(bpy.types.Operator, ImportHelper):
@@ -36,6 +37,49 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
         options={'HIDDEN'},
     )
 
+    import_single_scene = BoolProperty(
+        name='Only One Scene',
+        description='Only import one scene and what it uses',
+        default=False,
+    )
+    scene_index = IntProperty(
+        name='Scene Index',
+        description='Index of the scene to import when importing only one (-1 for the default scene)',
+        default=-1,
+        min=-1,
+    )
+
+    use_mmap = BoolProperty(
+        name='Memory-map Files',
+        description='Map .glb and .bin files into memory instead of reading them in full',
+        default=True,
+    )
+
+    accessor_cache_dir = StringProperty(
+        name='Accessor Cache',
+        description='Keep decoded accessors here to speed up importing the same file again (disabled if empty)',
+        default='',
+        subtype='DIR_PATH',
+    )
+    accessor_cache_size = IntProperty(
+        name='Accessor Cache Size (MB)',
+        description='Remove the least recently used accessors from the cache when it gets bigger than this',
+        default=1024,
+        min=0,
+    )
+
+    profile_report = StringProperty(
+        name='Profile Report',
+        description='Write a JSON report with the time spent in each stage of the import to this file',
+        default='',
+        subtype='FILE_PATH',
+    )
+    profile_cprofile = BoolProperty(
+        name='cProfile Stats',
+        description='Also dump cProfile stats next to the profile report',
+        default=False,
+    )
+
     def get_buffer(self, idx):
         if idx not in self.buffers:
             self.buffers[idx] = buffer.create_buffer(self, idx)
@@ -48,22 +92,47 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
 
     def get_accessor(self, idx):
         if idx not in self.accessors:
-            self.accessors[idx] = buffer.create_accessor(self, idx)
+            cached = self.accessor_cache.get(idx) if self.accessor_cache else None
+            if cached is not None:
+                self.accessors[idx] = cached
+                self.profiler.count('accessorDiskCacheHits')
+            else:
+                with self.profiler.stage('accessors'):
+                    self.accessors[idx] = buffer.create_accessor(self, idx)
+                self.profiler.count('accessorsDecoded')
+                self.profiler.count('bytesDecoded', self.accessors[idx].nbytes)
+                if self.accessor_cache:
+                    self.accessor_cache.put(idx, self.accessors[idx])
+        else:
+            self.profiler.count('accessorCacheHits')
         return self.accessors[idx]
 
+    def get_image(self, idx):
+        if idx in self.images:
+            self.image_cache_stats['hits'] += 1
+        else:
+            with self.profiler.stage('images'):
+                self.images[idx] = material.create_image(self, idx)
+            self.uses.release(self, ('image', idx))
+        return self.images[idx]
+
     def get_material(self, idx):
         if idx not in self.materials:
-            self.materials[idx] = material.create_material(self, idx)
+            with self.profiler.stage('materials'):
+                self.materials[idx] = material.create_material(self, idx)
         return self.materials[idx]
 
     def get_default_material(self):
         if not self.default_material:
-            self.default_material = material.create_default_material(self)
+            with self.profiler.stage('materials'):
+                self.default_material = material.create_default_material(self)
         return self.default_material
 
     def get_mesh(self, idx):
         if idx not in self.meshes:
-            self.meshes[idx] = mesh.create_mesh(self, idx)
+            with self.profiler.stage('meshes'):
+                self.meshes[idx] = mesh.create_mesh(self, idx)
+            self.uses.release(self, ('mesh', idx))
         return self.meshes[idx]
 
     def get_camera(self, idx):
@@ -77,7 +146,24 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
     def generate_actions(self):
         if 'animations' in self.gltf:
             for idx in range(0, len(self.gltf['animations'])):
-                animation.create_action(self, idx)
+                if self.reachable is None or idx in self.reachable['animations']:
+                    animation.create_action(self, idx)
+                    self.uses.release(self, ('animation', idx))
+
+    def choose_scene(self):
+        """Pick the scene to import if only one is wanted and find what
+        it uses (see reachability.py).
+        """
+        scenes = self.gltf.get('scenes', [])
+        if not self.import_single_scene or not scenes:
+            return
+        if self.scene_index >= 0:
+            self.scene_idx = self.scene_index
+        else:
+            self.scene_idx = self.gltf.get('scene', 0)
+        if self.scene_idx >= len(scenes):
+            raise Exception('scene index out of range: %d' % self.scene_idx)
+        self.reachable = reachability.find_reachable(self.gltf, self.scene_idx)
 
     def check_version(self):
         def str_to_version(s):
@@ -118,8 +204,7 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
         filename = self.filepath
         self.base_path = os.path.dirname(filename)
 
-        with open(filename, 'rb') as f:
-            contents = f.read()
+        contents = buffer.read_file(self, filename)
 
         # Use magic number to detect GLB files.
         is_glb = contents[:4] == b'glTF'
@@ -127,9 +212,12 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
         if is_glb:
             self.parse_glb(contents)
         else:
-            self.gltf = json.loads(contents.decode('utf-8'))
+            (self.gltf, self.lazy_data_uris) = datauri.load_json(contents)
 
     def parse_glb(self, contents):
+        # Work on a memoryview so the chunks we slice out share memory
+        # with contents instead of being copied.
+        contents = memoryview(contents)
         header = struct.unpack_from('<4sII', contents)
         glb_version = header[1]
         if glb_version != 2:
@@ -148,7 +236,7 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
         json_chunk = parse_chunk(offset)
         if json_chunk['type'] != b'JSON':
             raise Exception('GLB: JSON chunk must be first')
-        self.gltf = json.loads(json_chunk['data'].decode('utf-8'))
+        (self.gltf, self.lazy_data_uris) = datauri.load_json(json_chunk['data'])
 
         offset = json_chunk['next_offset']
 
@@ -163,7 +251,7 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
             if chunk['type'] == b'JSON':
                 raise Exception('GLB: Too many JSON chunks, should be 1')
 
-            if self.glb_buffer:
+            if self.glb_buffer is not None:
                 raise Exception('GLB: Too many BIN chunks, should be 0 or 1')
 
             self.glb_buffer = chunk['data']
@@ -176,28 +264,108 @@ class ImportGLTF(bpy.types.Operator, ImportHelper):
         self.buffer_views = {}
         self.accessors = {}
         self.cameras = {}
+        self.images = {}
+        # Maps the source of an image (its path or a hash of its contents)
+        # to the Blender image, see material.create_image
+        self.images_by_source = {}
+        # How often get_image could reuse an image; hits include images
+        # with the same source as one loaded before
+        self.image_cache_stats = {'hits': 0, 'misses': 0}
+        # Maps an image index to the future reading it, see
+        # material.prefetch_images
+        self.image_prefetch = {}
+        # Limits how many prefetched images are held decoded at once
+        self.image_prefetch_slots = None
         self.default_material = None
         self.pbr_group = None
         self.materials = {}
         self.meshes = {}
+        # Maps a mesh index to the index of the mesh whose Blender mesh it
+        # shares (see mesh.find_shared_meshes)
+        self.mesh_instance_of = []
+        # Who still needs each accessor, buffer view and buffer (see
+        # liveness.py)
+        self.uses = liveness.Uses()
+        # Maps a mesh index to the skin weights that still have to be put
+        # into vertex groups (see mesh.assign_skin_weights)
+        self.mesh_skin_weights = {}
+        # Maps a mesh index to the morph targets that still have to be
+        # turned into shape keys (see mesh.create_shape_keys)
+        self.mesh_morph_targets = {}
         self.scenes = {}
+        # The index of the only scene to import, and what it uses (see
+        # choose_scene); None to import all of them
+        self.scene_idx = None
+        self.reachable = None
         # Indices of the root nodes
         self.root_idxs = []
         # Maps the index of a root node to the objects in that tree
         self.root_to_objects = {}
         # Maps a node index to the corresponding bone's name
         self.node_to_bone_name = {}
-
-        self.load()
-
-        self.check_version()
-        self.check_required_extensions()
-
-        node.generate_scenes(self)
-        self.generate_actions()
-
-        if 'scene' in self.gltf:
-            bpy.context.screen.scene = self.scenes[self.gltf['scene']]
+        # Files mapped into memory by buffer.read_file
+        self.mapped_files = []
+        # Data URIs left in the file contents by datauri.load_json
+        self.lazy_data_uris = []
+        # Decodes data URIs, each one only once
+        self.decoded_data_uris = datauri.DataURICache()
+        # The on-disk accessor cache, if enabled (see accessor_cache.py)
+        self.accessor_cache = None
+        self.profiler = profiling.Profiler(
+            enabled=bool(self.profile_report),
+            use_cprofile=self.profile_cprofile,
+        )
+
+        self.profiler.start()
+        try:
+            with self.profiler.stage('load'):
+                self.load()
+
+            with self.profiler.stage('checks'):
+                self.check_version()
+                self.check_required_extensions()
+
+            self.choose_scene()
+            self.accessor_cache = accessor_cache.open_cache(self)
+            mesh.find_shared_meshes(self)
+            self.uses = liveness.count_uses(self)
+
+            with self.profiler.stage('prefetch_images'):
+                material.prefetch_images(self)
+            node.generate_scenes(self)
+            with self.profiler.stage('animations'):
+                self.generate_actions()
+
+            if self.scene_idx is not None:
+                bpy.context.screen.scene = self.scenes[self.scene_idx]
+            elif 'scene' in self.gltf:
+                bpy.context.screen.scene = self.scenes[self.gltf['scene']]
+
+            if self.images:
+                print('Image cache: %(hits)d hits, %(misses)d misses' % self.image_cache_stats)
+        finally:
+            # Drop our views into the mapped files so they can be unmapped.
+            self.glb_buffer = None
+            self.buffers = {}
+            self.buffer_views = {}
+            self.image_prefetch = {}
+            self.decoded_data_uris.clear()
+            datauri.release(self.lazy_data_uris)
+            buffer.release_files(self)
+            if self.accessor_cache:
+                with self.profiler.stage('accessor_cache_eviction'):
+                    self.accessor_cache.evict()
+            self.profiler.stop()
+
+        if self.profile_report:
+            self.profiler.count('imageCacheHits', self.image_cache_stats['hits'])
+            self.profiler.count('imageCacheMisses', self.image_cache_stats['misses'])
+            report_path = self.profile_report
+            # Blender paths can be relative to the .blend file; the
+            # cProfile stats go next to the report, so this covers both
+            if report_path.startswith('//'):
+                report_path = bpy.path.abspath(report_path)
+            self.profiler.write(report_path)
 
         return {'FINISHED'}
 
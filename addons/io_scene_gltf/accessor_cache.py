@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+
+import bpy
+import numpy as np
+
+"""
+On-disk cache of decoded accessors.
+
+When the same file is imported again, its accessors can be loaded from
+the cache instead of being decoded. Each accessor is stored as a .npy
+file in a directory named after a key made from the path, modification
+time and size of the glTF file and of every external buffer it uses, so
+changing any of them invalidates the cache. Arrays are loaded memory-
+mapped (copy-on-write), so only the pages that are used get read.
+
+The cache has a size limit; when it's exceeded, the least recently used
+files are removed. Eviction only ever touches the cache's own key
+directories and accessor files, so the cache can live in a directory
+that holds other things too.
+"""
+
+
+# Bump this when the decoded form of accessors changes
+CACHE_VERSION = 1
+
+# Names of the directories and files the cache makes
+KEY_DIR_RE = re.compile(r'^[0-9a-f]{40}$')
+ACCESSOR_FILE_RE = re.compile(r'^accessor[0-9]+\.npy$')
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return '%s:%d:%d' % (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def make_key(op):
+    """Make the cache key for the file op is importing."""
+    parts = ['v%d' % CACHE_VERSION, file_key(op.filepath)]
+    for buf in op.gltf.get('buffers', []):
+        uri = buf.get('uri', '')
+        if uri and not uri.startswith('data:'):
+            parts.append(file_key(os.path.join(op.base_path, uri)))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def open_cache(op):
+    """Return the AccessorCache for an import, or None if it's disabled."""
+    if not op.accessor_cache_dir:
+        return None
+    cache_dir = op.accessor_cache_dir
+    # Blender paths can be relative to the .blend file
+    if cache_dir.startswith('//'):
+        cache_dir = bpy.path.abspath(cache_dir)
+    return AccessorCache(cache_dir, make_key(op), op.accessor_cache_size * 1024 * 1024)
+
+
+class AccessorCache:
+    def __init__(self, cache_dir, key, size_limit):
+        self.cache_dir = cache_dir
+        self.dir = os.path.join(cache_dir, key)
+        self.size_limit = size_limit
+
+    def path(self, idx):
+        return os.path.join(self.dir, 'accessor%d.npy' % idx)
+
+    def get(self, idx):
+        """Load an accessor, or return None if it isn't in the cache."""
+        path = self.path(idx)
+        try:
+            array = np.load(path, mmap_mode='c')
+        except (OSError, ValueError):
+            return None
+        # The modification time is what eviction goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+    def put(self, idx, array):
+        """Store a decoded accessor."""
+        path = self.path(idx)
+        tmp_path = path + '.tmp%d' % os.getpid()
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            # Readers never see a half-written file
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            print('WARNING! Could not write to the accessor cache:', e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits in
+        its size limit.
+        """
+        key_dirs = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if KEY_DIR_RE.match(name) and os.path.isdir(path) and not os.path.islink(path):
+                key_dirs.append(path)
+
+        entries = []
+        for key_dir in key_dirs:
+            try:
+                filenames = os.listdir(key_dir)
+            except OSError:
+                continue
+            for filename in filenames:
+                if not ACCESSOR_FILE_RE.match(filename):
+                    continue
+                path = os.path.join(key_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for (_, size, _) in entries)
+        entries.sort()
+        for (_, size, path) in entries:
+            if total <= self.size_limit:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        # Clean up key directories left empty
+        for key_dir in key_dirs:
+            try:
+                os.rmdir(key_dir)
+            except OSError:
+                pass
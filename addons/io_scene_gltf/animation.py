@@ -1,9 +1,214 @@
 import bpy
+import numpy as np
+
+from io_scene_gltf import node as node_module
+
+"""
+Handle animations.
+
+Each glTF animation becomes an action on the node forest armature, with
+the translation/rotation/scale channels of a node driving the pose of its
+bone. Morph target weight channels go into a separate action on the shape
+keys of the node's mesh.
+
+Pose bones are posed relative to their rest position, so the glTF values,
+which replace the node's local transform, are converted. If the rest
+transform of a node is T_r R_r S_r, then a translation t becomes a pose
+location of R_r^-1 (t - t_r), a rotation q becomes q_r^-1 q and a scale s
+becomes s / s_r. Like everywhere else, scaling the rest positions of
+bones isn't really supported.
+
+Keyframes are written in bulk with keyframe_points.add and foreach_set.
+"""
+
+
+# Values of the FCurve keyframe interpolation enum
+INTERPOLATION_LUT = {
+    'STEP': ('CONSTANT', 0),
+    'LINEAR': ('LINEAR', 1),
+    'CUBICSPLINE': ('BEZIER', 2),
+}
+
+
+def quaternion_multiply(a, b):
+    """Multiply arrays of wxyz quaternions."""
+    (aw, ax, ay, az) = np.rollaxis(np.asarray(a), -1)
+    (bw, bx, by, bz) = np.rollaxis(np.asarray(b), -1)
+    return np.concatenate([
+        component[..., np.newaxis] for component in (
+            aw * bw - ax * bx - ay * by - az * bz,
+            aw * bx + ax * bw + ay * bz - az * by,
+            aw * by - ax * bz + ay * bw + az * bx,
+            aw * bz + ax * by - ay * bx + az * bw,
+        )
+    ], axis=-1)
+
+
+def make_continuous(quats):
+    """Flip the signs of quaternions so consecutive ones are never more
+    than 180 degrees apart, which makes them interpolate the short way.
+    """
+    if len(quats) < 2:
+        return quats
+    dots = np.sum(quats[1:] * quats[:-1], axis=1)
+    flips = np.concatenate(([1], np.cumprod(np.where(dots < 0, -1, 1))))
+    return quats * flips[:, np.newaxis]
+
+
+def get_rest_transform(node):
+    """Return the (translation, wxyz rotation, scale) of a node's rest pose."""
+    if 'matrix' in node:
+        (loc, rot, scale) = node_module.convert_matrix(node['matrix']).decompose()
+        return (np.array(loc), np.array(rot), np.array(scale))
+    t = node.get('translation', [0, 0, 0])
+    q = node.get('rotation', [0, 0, 0, 1])
+    s = node.get('scale', [1, 1, 1])
+    return (np.array(t), np.array([q[3], q[0], q[1], q[2]]), np.array(s))
+
+
+def quaternion_to_matrix(q):
+    """Convert a wxyz quaternion to a 3x3 rotation matrix."""
+    (w, x, y, z) = q / np.linalg.norm(q)
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def decode_sampler(op, sampler, fps):
+    """Decode a sampler into (frames, values, interpolation).
+
+    values has one row per keyframe. For cubic splines we only keep the
+    values and drop the tangents; Blender's automatic handles are used
+    instead.
+    """
+    frames = op.get_accessor(sampler['input']).astype(np.float32) * fps
+    values = op.get_accessor(sampler['output']).astype(np.float32)
+    interpolation = sampler.get('interpolation', 'LINEAR')
+
+    if interpolation == 'CUBICSPLINE':
+        # (in-tangent, value, out-tangent) for each keyframe
+        values = values.reshape(len(frames), 3, -1)[:, 1]
+    else:
+        values = values.reshape(len(frames), -1)
+
+    return (frames, values, interpolation)
+
+
+def add_fcurve(action, data_path, index, group, frames, values, interpolation):
+    fcurve = action.fcurves.new(data_path, index=index, action_group=group)
+    keyframes = fcurve.keyframe_points
+    keyframes.add(len(frames))
+
+    co = np.empty(2 * len(frames), dtype=np.float32)
+    co[0::2] = frames
+    co[1::2] = values
+    keyframes.foreach_set('co', co)
+
+    (ipo_name, ipo_value) = INTERPOLATION_LUT.get(interpolation, INTERPOLATION_LUT['LINEAR'])
+    try:
+        keyframes.foreach_set('interpolation', np.full(len(frames), ipo_value, dtype=np.int32))
+    except (TypeError, AttributeError, RuntimeError):
+        # Older Blenders can't foreach_set enums
+        for keyframe in keyframes:
+            keyframe.interpolation = ipo_name
+
+    fcurve.update()
+
+
+def quote(name):
+    """Quote a name for use in an RNA path."""
+    return '"%s"' % name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def add_bone_channel(op, action, node_idx, path, sampler):
+    (frames, values, interpolation) = sampler
+    bone_name = op.node_to_bone_name[node_idx]
+    (rest_t, rest_q, rest_s) = get_rest_transform(op.gltf['nodes'][node_idx])
+
+    if path == 'translation':
+        # Row vectors times R_r is R_r^-1 (= R_r^T) times column vectors
+        values = np.dot(values - rest_t, quaternion_to_matrix(rest_q))
+        prop = 'location'
+    elif path == 'rotation':
+        # xyzw -> wxyz
+        values = values[:, [3, 0, 1, 2]]
+        rest_inv = rest_q * np.array([1, -1, -1, -1]) / np.dot(rest_q, rest_q)
+        values = make_continuous(quaternion_multiply(rest_inv, values))
+        prop = 'rotation_quaternion'
+    else:
+        values = values / rest_s
+        prop = 'scale'
+
+    data_path = 'pose.bones[%s].%s' % (quote(bone_name), prop)
+    for i in range(0, values.shape[1]):
+        add_fcurve(action, data_path, i, bone_name, frames, values[:, i], interpolation)
 
 
 def create_action(op, idx):
     anim = op.gltf['animations'][idx]
     name = anim.get('name', 'animations[%d]' % idx)
+    fps = bpy.context.scene.render.fps
 
     action = bpy.data.actions.new(name)
+    action.use_fake_user = True
+
+    # Samplers can be shared by several channels; decode each one once.
+    samplers = {}
+
+    def get_sampler(sampler_idx):
+        if sampler_idx not in samplers:
+            samplers[sampler_idx] = decode_sampler(op, anim['samplers'][sampler_idx], fps)
+        return samplers[sampler_idx]
+
+    # Maps a mesh index to the action for its shape keys
+    shape_key_actions = {}
+
+    for channel in anim['channels']:
+        target = channel['target']
+        # Skip nodes outside the imported scene too
+        if target.get('node') not in op.node_to_bone_name:
+            continue
+        node_idx = target['node']
+        path = target['path']
+        sampler = get_sampler(channel['sampler'])
+
+        if path in ('translation', 'rotation', 'scale'):
+            add_bone_channel(op, action, node_idx, path, sampler)
+
+        elif path == 'weights':
+            node = op.gltf['nodes'][node_idx]
+            if 'mesh' not in node:
+                continue
+            mesh_idx = op.mesh_instance_of[node['mesh']]
+            key = op.get_mesh(mesh_idx).shape_keys
+            if key is None:
+                continue
+
+            if mesh_idx not in shape_key_actions:
+                key_action = bpy.data.actions.new('%s.%s' % (name, key.name))
+                key_action.use_fake_user = True
+                shape_key_actions[mesh_idx] = key_action
+                if not key.animation_data:
+                    key.animation_data_create()
+                if not key.animation_data.action:
+                    key.animation_data.action = key_action
+            key_action = shape_key_actions[mesh_idx]
+
+            (frames, values, interpolation) = sampler
+            # key_blocks[0] is the basis
+            key_blocks = key.key_blocks[1:]
+            values = values.reshape(len(frames), -1)
+            for i, key_block in enumerate(key_blocks[:values.shape[1]]):
+                data_path = 'key_blocks[%s].value' % quote(key_block.name)
+                add_fcurve(key_action, data_path, 0, '', frames, values[:, i], interpolation)
+
+    # The first animation is the one that plays
+    arma_ob = op.armature_ob
+    if not arma_ob.animation_data:
+        arma_ob.animation_data_create()
+    if not arma_ob.animation_data.action:
+        arma_ob.animation_data.action = action
+
     return action
@@ -1,34 +1,73 @@
-import base64
+import mmap
 import os
-import struct
+
+import numpy as np
+
+
+def read_file(op, path):
+    """Return the contents of a file as a memoryview.
+
+    When op.use_mmap is set the file is memory-mapped instead of read, so
+    only the pages that actually get touched are loaded. The mapping is
+    kept in op.mapped_files until release_files is called.
+    """
+    with open(path, 'rb') as f:
+        if op.use_mmap:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Empty files (and some special files) can't be mapped;
+                # just read those.
+                pass
+            else:
+                op.mapped_files.append(mm)
+                return memoryview(mm)
+
+        return memoryview(f.read())
+
+
+def release_files(op):
+    """Unmap the files mapped by read_file.
+
+    All views into the files must have been dropped before calling this.
+    """
+    for mm in op.mapped_files:
+        try:
+            mm.close()
+        except BufferError:
+            # Someone still holds a view into the mapping; it will be
+            # unmapped when that goes away.
+            pass
+    op.mapped_files = []
 
 
 def create_buffer(op, idx):
+    """Return the contents of a buffer as a memoryview."""
     buffer = op.gltf['buffers'][idx]
 
     # Handle GLB buffer
-    if op.glb_buffer and idx == 0 and 'uri' not in buffer:
+    if op.glb_buffer is not None and idx == 0 and 'uri' not in buffer:
         return op.glb_buffer
 
     uri = buffer['uri']
 
     # Try to decode base64 data URIs
     if uri[:5] == 'data:':
-        idx = uri.find(';base64,')
-        if idx != -1:
-            base64_data = uri[idx+8:]
-            return base64.b64decode(base64_data)
+        data = op.decoded_data_uris.decode(uri)
+        if data is not None:
+            return memoryview(data)
 
     # If we got here, assume it's a filepath
     buffer_location = os.path.join(op.base_path, uri)  # TODO: absolute paths?
     print('Loading file', buffer_location)
-    with open(buffer_location, 'rb') as fp:
-        bytes_read = fp.read()
-
-    return bytes_read
+    return read_file(op, buffer_location)
 
 
 def create_buffer_view(op, idx):
+    """Return a (view, stride) pair for a buffer view.
+
+    The view is a memoryview slice of the buffer, so no data is copied.
+    """
     buffer_view = op.gltf['bufferViews'][idx]
     buffer = op.get_buffer(buffer_view['buffer'])
     byte_offset = buffer_view.get('byteOffset', 0)
@@ -45,78 +84,78 @@ def create_accessor(op, idx):
 
 
 def create_accessor_from_properties(op, accessor):
+    """Decode an accessor into a numpy array.
+
+    The result has shape (count, num_components), except for SCALAR
+    accessors which give a flat array of shape (count,). Normalized
+    integer accessors are converted to float32; everything else keeps
+    the accessor's component type.
+    """
     count = accessor['count']
-    fmt_char_lut = dict([
-        (5120, 'b'),  # BYTE
-        (5121, 'B'),  # UNSIGNED_BYTE
-        (5122, 'h'),  # SHORT
-        (5123, 'H'),  # UNSIGNED_SHORT
-        (5125, 'I'),  # UNSIGNED_INT
-        (5126, 'f')   # FLOAT
+    dtype_lut = dict([
+        (5120, np.dtype('<i1')),  # BYTE
+        (5121, np.dtype('<u1')),  # UNSIGNED_BYTE
+        (5122, np.dtype('<i2')),  # SHORT
+        (5123, np.dtype('<u2')),  # UNSIGNED_SHORT
+        (5125, np.dtype('<u4')),  # UNSIGNED_INT
+        (5126, np.dtype('<f4'))   # FLOAT
     ])
-    fmt_char = fmt_char_lut[accessor['componentType']]
-    component_size = struct.calcsize(fmt_char)
-    num_components_lut = {
-        'SCALAR': 1,
-        'VEC2': 2,
-        'VEC3': 3,
-        'VEC4': 4,
-        'MAT2': 4,
-        'MAT3': 9,
-        'MAT4': 16
+    dtype = dtype_lut[accessor['componentType']]
+    component_size = dtype.itemsize
+    # Shape of one element as (columns, rows); only matrices have
+    # more than one column.
+    shape_lut = {
+        'SCALAR': (1, 1),
+        'VEC2': (1, 2),
+        'VEC3': (1, 3),
+        'VEC4': (1, 4),
+        'MAT2': (2, 2),
+        'MAT3': (3, 3),
+        'MAT4': (4, 4)
     }
-    num_components = num_components_lut[accessor['type']]
-    fmt = '<' + (fmt_char * num_components)
-    default_stride = struct.calcsize(fmt)
+    num_columns, num_rows = shape_lut[accessor['type']]
+    num_components = num_columns * num_rows
 
     # Special layouts for certain formats; see the section about
-    # data alignment in the glTF 2.0 spec.
-    if accessor['type'] == 'MAT2' and component_size == 1:
-        fmt = '<' + \
-            (fmt_char * 2) + 'xx' + \
-            (fmt_char * 2)
-        default_stride = 8
-    elif accessor['type'] == 'MAT3' and component_size == 1:
-        fmt = '<' + \
-            (fmt_char * 3) + 'x' + \
-            (fmt_char * 3) + 'x' + \
-            (fmt_char * 3)
-        default_stride = 12
-    elif accessor['type'] == 'MAT3' and component_size == 2:
-        fmt = '<' + \
-            (fmt_char * 3) + 'xx' + \
-            (fmt_char * 3) + 'xx' + \
-            (fmt_char * 3)
-        default_stride = 24
-
-    normalize = None
-    if 'normalized' in accessor and accessor['normalized']:
-        normalize_lut = dict([
-            (5120, lambda x: max(x / (2**7 - 1), -1)),   # BYTE
-            (5121, lambda x: x / (2**8 - 1)),            # UNSIGNED_BYTE
-            (5122, lambda x: max(x / (2**15 - 1), -1)),  # SHORT
-            (5123, lambda x: x / (2**16 - 1)),           # UNSIGNED_SHORT
-            (5125, lambda x: x / (2**32 - 1))            # UNSIGNED_INT
-        ])
-        normalize = normalize_lut[accessor['componentType']]
+    # data alignment in the glTF 2.0 spec. Matrix columns start on
+    # 4-byte boundaries, so MAT2/MAT3 with 1- or 2-byte components
+    # have padding after each column.
+    column_stride = num_rows * component_size
+    if num_columns > 1:
+        column_stride = (column_stride + 3) // 4 * 4
+    default_stride = column_stride * num_columns
 
     if 'bufferView' in accessor:
         (buf, stride) = op.get_buffer_view(accessor['bufferView'])
         stride = stride or default_stride
+        off = accessor.get('byteOffset', 0)
+
+        # A strided view straight over the buffer; copying it gives us a
+        # packed array that no longer references the buffer.
+        view = np.ndarray(
+            shape=(count, num_columns, num_rows),
+            dtype=dtype,
+            buffer=buf,
+            offset=off,
+            strides=(stride, column_stride, component_size),
+        )
+        result = view.reshape(count, num_components)
+        result = result.astype(dtype.newbyteorder('='), copy=True)
     else:
-        stride = default_stride
-        buf = [0] * (stride * count)
-
-    off = accessor.get('byteOffset', 0)
-    result = []
-    while len(result) < count:
-        elem = struct.unpack_from(fmt, buf, offset=off)
-        if normalize:
-            elem = tuple([normalize(x) for x in elem])
-        if num_components == 1:
-            elem = elem[0]
-        result.append(elem)
-        off += stride
+        result = np.zeros((count, num_components), dtype=dtype.newbyteorder('='))
+
+    if accessor.get('normalized', False):
+        normalize_lut = dict([
+            (5120, 2**7 - 1),   # BYTE
+            (5121, 2**8 - 1),   # UNSIGNED_BYTE
+            (5122, 2**15 - 1),  # SHORT
+            (5123, 2**16 - 1),  # UNSIGNED_SHORT
+            (5125, 2**32 - 1)   # UNSIGNED_INT
+        ])
+        divisor = normalize_lut[accessor['componentType']]
+        result = result.astype(np.float32) / np.float32(divisor)
+        if dtype.kind == 'i':
+            np.maximum(result, -1, out=result)
 
     if 'sparse' in accessor:
         sparse = accessor['sparse']
@@ -138,7 +177,9 @@ def create_accessor_from_properties(op, accessor):
         }
         values = create_accessor_from_properties(op, values_props)
 
-        for (index, val) in zip(indices, values):
-            result[index] = val
+        result[indices] = values.reshape(-1, num_components)
+
+    if num_components == 1:
+        result = result.reshape(count)
 
     return result
@@ -0,0 +1,191 @@
+import binascii
+import concurrent.futures
+import json
+import re
+import threading
+
+"""
+Handle base64 data URIs.
+
+A .gltf can embed its buffers and images as data URIs, which for big
+assets means hundreds of MB of base64 inside the JSON. Parsing that with
+json.loads would make a Python string of every payload, and decoding it
+would then make another copy.
+
+Instead, load_json finds the large payloads of "uri" properties with a
+regex over the file contents (which are usually memory-mapped) and parses
+a copy of the document with the payloads cut out. In the parsed glTF
+their URIs become LazyDataURIs, which only point into the file contents. decode turns a
+data URI into bytes; LazyDataURIs are decoded in chunks straight into a
+preallocated buffer, so the base64 text is never copied as a whole.
+"""
+
+
+# Payloads shorter than this are left in the JSON
+LAZY_MIN_SIZE = 64 * 1024
+# How much base64 text to decode at a time; a multiple of 4
+CHUNK_SIZE = 4 * 1024 * 1024
+
+LAZY_DATA_URI_RE = re.compile(
+    (r'"uri"\s*:\s*"(data:[^",]*?;base64,)([A-Za-z0-9+/=]{%d,})"' % LAZY_MIN_SIZE).encode('ascii')
+)
+PLACEHOLDER = '#lazy-data-uri:'
+# base64 in URIs can be wrapped or have spaces in it
+WHITESPACE_RE = re.compile(r'\s')
+WHITESPACE_BYTES_RE = re.compile(rb'\s')
+
+
+class LazyDataURI(str):
+    """A data URI whose payload is still in the file.
+
+    As a string it's just the URI's 'data:...;base64,' header; payload is
+    a memoryview of the base64 text in the file contents and offset is
+    where that text starts in the file.
+    """
+
+    def __new__(cls, header, payload, offset):
+        uri = str.__new__(cls, header)
+        uri.payload = payload
+        uri.offset = offset
+        return uri
+
+
+def load_json(contents):
+    """Parse a glTF JSON document, leaving large data URIs in contents.
+
+    Returns (gltf, lazy_uris), where lazy_uris lists the LazyDataURIs now
+    in the glTF, so they can be released with release.
+    """
+    contents = memoryview(contents)
+    pieces = []
+    lazy_uris = []
+    pos = 0
+    for match in LAZY_DATA_URI_RE.finditer(contents):
+        # Only the URI string is replaced; the key stays
+        pieces.append(contents[pos:match.start(1) - 1])
+        pieces.append(('"%s%d"' % (PLACEHOLDER, len(lazy_uris))).encode('ascii'))
+        header = match.group(1).decode('ascii')
+        lazy_uris.append(LazyDataURI(header, contents[match.start(2):match.end(2)], match.start(2)))
+        pos = match.end()
+    pieces.append(contents[pos:])
+
+    def restore(obj):
+        # Put the lazy URIs back wherever they were, not just in buffers
+        # and images (extensions can have URIs too)
+        uri = obj.get('uri')
+        if isinstance(uri, str) and uri.startswith(PLACEHOLDER):
+            obj['uri'] = lazy_uris[int(uri[len(PLACEHOLDER):])]
+        return obj
+
+    gltf = json.loads(b''.join(pieces).decode('utf-8'), object_hook=restore if lazy_uris else None)
+
+    return (gltf, lazy_uris)
+
+
+def release(lazy_uris):
+    """Drop the LazyDataURIs' views into the file contents."""
+    for uri in lazy_uris:
+        uri.payload = None
+
+
+def decode_payload(text, start=0):
+    """Decode the base64 in text[start:] in chunks.
+
+    text can be an ASCII str or a bytes-like object. Only one chunk of it
+    is sliced out at a time, so it's never copied as a whole, unless it
+    has whitespace in it, which is taken out first.
+    """
+    whitespace_re = WHITESPACE_RE if isinstance(text, str) else WHITESPACE_BYTES_RE
+    if whitespace_re.search(text, start):
+        if isinstance(text, str):
+            text = ''.join(text[start:].split())
+        else:
+            text = b''.join(bytes(text[start:]).split())
+        start = 0
+    size = len(text) - start
+    if size % 4 != 0:
+        raise Exception('invalid base64 in data URI: incorrect padding')
+    tail = text[len(text) - min(2, size):]
+    if not isinstance(tail, str):
+        tail = bytes(tail).decode('ascii')
+    padding = len(tail) - len(tail.rstrip('='))
+
+    result = bytearray(size // 4 * 3 - padding)
+    out = 0
+    for chunk_start in range(start, len(text), CHUNK_SIZE):
+        chunk = binascii.a2b_base64(text[chunk_start:chunk_start + CHUNK_SIZE])
+        result[out:out + len(chunk)] = chunk
+        out += len(chunk)
+    return result
+
+
+def find_payload(uri):
+    """Return (text, start) such that text[start:] is the base64 payload of
+    a data URI, or None if it isn't base64.
+    """
+    if isinstance(uri, LazyDataURI):
+        if uri.payload is None:
+            raise Exception('data URI was already released')
+        return (uri.payload, 0)
+    found_at = uri.find(';base64,')
+    if found_at == -1:
+        return None
+    return (uri, found_at + 8)
+
+
+def decode(uri):
+    """Decode a base64 data URI.
+
+    Returns a bytearray, or None if the URI isn't base64.
+    """
+    payload = find_payload(uri)
+    if payload is None:
+        return None
+    return decode_payload(*payload)
+
+
+class DataURICache:
+    """Decodes data URIs, each distinct one only once.
+
+    Plain URIs are told apart by their text, lazy ones by where they are
+    in the file. This is thread-safe: if a URI is being decoded on another
+    thread, decode waits for that instead of decoding it again.
+
+    The result is kept until release is called for the URI, which should
+    happen once the buffer or image it's for is done with.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+
+    @staticmethod
+    def key(uri):
+        if isinstance(uri, LazyDataURI):
+            return ('offset', uri.offset)
+        return ('uri', uri)
+
+    def decode(self, uri):
+        key = self.key(uri)
+        with self.lock:
+            future = self.results.get(key)
+            is_first = future is None
+            if is_first:
+                future = concurrent.futures.Future()
+                self.results[key] = future
+
+        if is_first:
+            try:
+                future.set_result(decode(uri))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def release(self, uri):
+        """Forget the decoded data for uri; it's decoded again if needed."""
+        with self.lock:
+            self.results.pop(self.key(uri), None)
+
+    def clear(self):
+        with self.lock:
+            self.results = {}
@@ -0,0 +1,100 @@
+import math
+
+import bpy
+import numpy as np
+
+"""
+Handle EXT_mesh_gpu_instancing.
+
+Instead of creating an object for every instance, the instances of a node
+are turned into the faces of one instancer mesh that uses Blender's
+DupliFaces: its child object (the one with the node's mesh) is drawn once
+for every face, placed at the face's center, turned so its Z axis points
+along the face normal and its X axis along the first edge, and scaled by
+the square root of the face's area times dupli_faces_scale.
+
+So each instance becomes a triangle built from a canonical triangle (with
+its centroid at the origin, its first edge along +X and area 1/2) by the
+instance's transform; with a dupli_faces_scale of sqrt(2) the instance
+ends up with the right translation, rotation and scale. Only uniform
+scales can be represented this way.
+"""
+
+
+# Corners of the canonical triangle; its centroid is at the origin
+CANONICAL_TRIANGLE = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float64) - [1 / 3, 1 / 3, 0]
+# sqrt(area of the canonical triangle) * DUPLI_FACES_SCALE = 1
+DUPLI_FACES_SCALE = math.sqrt(2)
+
+
+def quaternions_to_matrices(quats):
+    """Convert an array of xyzw quaternions to an array of 3x3 matrices."""
+    quats = quats / np.linalg.norm(quats, axis=1)[:, np.newaxis]
+    (x, y, z, w) = quats.T
+    rows = [
+        np.column_stack((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w))),
+        np.column_stack((2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w))),
+        np.column_stack((2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y))),
+    ]
+    return np.concatenate([row[:, np.newaxis, :] for row in rows], axis=1)
+
+
+def instance_triangles(translations, rotations, scales):
+    """Make the triangle for each instance.
+
+    Takes (N, 3) translations, (N, 4) xyzw rotations and (N,) uniform
+    scales; returns the (N, 3, 3) corners of the triangles.
+    """
+    matrices = quaternions_to_matrices(rotations) * scales[:, np.newaxis, np.newaxis]
+    corners = np.einsum('nij,kj->nki', matrices, CANONICAL_TRIANGLE)
+    return corners + translations[:, np.newaxis, :]
+
+
+def decode_instances(op, ext):
+    """Decode the (translations, rotations, uniform scales) of the instances."""
+    attributes = ext['attributes']
+    count = op.gltf['accessors'][next(iter(attributes.values()))]['count']
+
+    def get(name, default):
+        if name in attributes:
+            return op.get_accessor(attributes[name]).astype(np.float64).reshape(count, -1)
+        return np.tile(np.array(default, dtype=np.float64), (count, 1))
+
+    translations = get('TRANSLATION', [0, 0, 0])
+    rotations = get('ROTATION', [0, 0, 0, 1])
+    scales = get('SCALE', [1, 1, 1])
+
+    if np.any(scales.max(axis=1) - scales.min(axis=1) > 1e-5 * np.abs(scales).max(axis=1)):
+        print(
+            'WARNING! Non-uniform instance scales are not supported. '
+            'Their average will be used.'
+        )
+    return (translations, rotations, scales.mean(axis=1))
+
+
+def create_instancer_mesh(op, name, ext):
+    """Create the mesh with one triangle for each instance."""
+    (translations, rotations, scales) = decode_instances(op, ext)
+    corners = instance_triangles(translations, rotations, scales)
+    num_faces = len(corners)
+
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(3 * num_faces)
+    me.vertices.foreach_set('co', corners.astype(np.float32).reshape(-1))
+    me.loops.add(3 * num_faces)
+    me.loops.foreach_set('vertex_index', np.arange(0, 3 * num_faces, dtype=np.int32))
+    me.polygons.add(num_faces)
+    me.polygons.foreach_set('loop_start', np.arange(0, 3 * num_faces, 3, dtype=np.int32))
+    me.polygons.foreach_set('loop_total', np.full(num_faces, 3, dtype=np.int32))
+    me.update(calc_edges=True)
+
+    op.profiler.count('instances', num_faces)
+    return me
+
+
+def make_instancer(instancer, ob):
+    """Make ob get drawn on each face of instancer."""
+    instancer.dupli_type = 'FACES'
+    instancer.use_dupli_faces_scale = True
+    instancer.dupli_faces_scale = DUPLI_FACES_SCALE
+    ob.parent = instancer
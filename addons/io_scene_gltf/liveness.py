@@ -0,0 +1,128 @@
+"""
+Free buffers, buffer views and accessors once nothing needs them.
+
+The op caches every buffer, buffer view and accessor it loads. Keeping
+them all until the import finishes means the peak memory use is all of
+the raw data plus all of the decoded data at once. Instead, Uses counts
+up front who uses each of them, and as soon as the last user has been
+built they're dropped from the caches:
+
+ * an accessor is used by the meshes, animations and instanced nodes
+   that read it,
+ * a buffer view by the accessors (including their sparse data) and
+   images stored in it,
+ * a buffer by its buffer views.
+
+Only the users that will actually be built are counted: meshes that
+share another mesh's Blender mesh and things outside the imported scene
+are left out. If something is asked for again after it was dropped, it
+just gets loaded again.
+"""
+
+
+class Uses:
+    def __init__(self):
+        # Maps (kind, index) of an accessor, buffer view or buffer to the
+        # number of users it has left
+        self.counts = {}
+        # Maps a user to the list of (kind, index) it uses
+        self.used_by = {}
+
+    def add(self, user, used):
+        """Record that user uses each of the (kind, index) pairs in used."""
+        used = list(dict.fromkeys(used))  # Once per user
+        self.used_by.setdefault(user, []).extend(used)
+        for key in used:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def release(self, op, user):
+        """Called when user has been built; frees what's no longer used."""
+        stack = list(self.used_by.pop(user, []))
+        while stack:
+            key = stack.pop()
+            if key not in self.counts:
+                continue
+            self.counts[key] -= 1
+            if self.counts[key] > 0:
+                continue
+            del self.counts[key]
+
+            (kind, idx) = key
+            cache = {'accessor': op.accessors, 'bufferView': op.buffer_views, 'buffer': op.buffers}[kind]
+            if cache.pop(idx, None) is not None:
+                op.profiler.count(kind + 'sEvicted')
+            if kind == 'buffer':
+                # A buffer from a data URI is only really freed once the
+                # decoded URI is dropped too
+                uri = op.gltf['buffers'][idx].get('uri', '')
+                if uri[:5] == 'data:':
+                    op.decoded_data_uris.release(uri)
+            # It's done with whatever it used itself
+            stack += self.used_by.pop(key, [])
+
+
+def accessor_uses(accessor):
+    views = []
+    if 'bufferView' in accessor:
+        views.append(accessor['bufferView'])
+    sparse = accessor.get('sparse')
+    if sparse:
+        views.append(sparse['indices']['bufferView'])
+        views.append(sparse['values']['bufferView'])
+    return [('bufferView', view) for view in views]
+
+
+def count_uses(op):
+    """Work out who uses what for the file op is importing."""
+    gltf = op.gltf
+    reachable = op.reachable
+    uses = Uses()
+
+    def is_built(kind, idx):
+        return reachable is None or idx in reachable[kind]
+
+    # Meshes (only the ones that get created) and their accessors. A mesh
+    # that shares another one's Blender mesh builds that one instead.
+    if reachable is None:
+        built_meshes = set(op.mesh_instance_of)
+    else:
+        built_meshes = {op.mesh_instance_of[idx] for idx in reachable['meshes']}
+    for idx, mesh in enumerate(gltf.get('meshes', [])):
+        if idx not in built_meshes:
+            continue
+        accessors = []
+        for primitive in mesh['primitives']:
+            accessors += primitive['attributes'].values()
+            if 'indices' in primitive:
+                accessors.append(primitive['indices'])
+            for target in primitive.get('targets', []):
+                accessors += target.values()
+        uses.add(('mesh', idx), [('accessor', i) for i in accessors])
+
+    for idx, anim in enumerate(gltf.get('animations', [])):
+        if not is_built('animations', idx):
+            continue
+        accessors = []
+        for sampler in anim['samplers']:
+            accessors += [sampler['input'], sampler['output']]
+        uses.add(('animation', idx), [('accessor', i) for i in accessors])
+
+    for idx, node in enumerate(gltf.get('nodes', [])):
+        gpu_instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+        if gpu_instancing and 'mesh' in node and is_built('nodes', idx):
+            accessors = gpu_instancing['attributes'].values()
+            uses.add(('node', idx), [('accessor', i) for i in accessors])
+
+    for idx, image in enumerate(gltf.get('images', [])):
+        if 'bufferView' in image and is_built('images', idx):
+            uses.add(('image', idx), [('bufferView', image['bufferView'])])
+
+    # Accessors and buffer views that are used by something
+    for idx, accessor in enumerate(gltf.get('accessors', [])):
+        if ('accessor', idx) in uses.counts:
+            uses.add(('accessor', idx), accessor_uses(accessor))
+    for idx, buffer_view in enumerate(gltf.get('bufferViews', [])):
+        if ('bufferView', idx) in uses.counts:
+            uses.add(('bufferView', idx), [('buffer', buffer_view['buffer'])])
+
+    return uses
@@ -1,63 +1,185 @@
-import base64
+import concurrent.futures
+import hashlib
 import os
-import tempfile
+import threading
 
 import bpy
 from bpy_extras.image_utils import load_image
 
+from io_scene_gltf import reachability
 
-def do_with_temp_file(contents, func):
-    """Call func with the path to a temp file containing contents.
 
-    The temp file will be deleted before this function returns.
-    """
-    path = None
-    try:
-        tmp = tempfile.NamedTemporaryFile(delete=False)
-        path = tmp.name
-        tmp.write(contents)
-        tmp.close()  # Have to close so func can open it
-        return func(path)
-    finally:
-        if path:
-            os.remove(path)
-
-
-def create_texture(op, idx, name, tree):
-    texture = op.gltf['textures'][idx]
-    source = op.gltf['images'][texture['source']]
-
-    tex_image = tree.nodes.new('ShaderNodeTexImage')
+# Number of threads prefetch_images reads images with
+PREFETCH_THREADS = 8
+# Most embedded images prefetch_images keeps decoded at once
+PREFETCH_MAX_HELD = 16
+# External image files are read in chunks this big to warm the OS cache
+WARM_CHUNK_SIZE = 1024 * 1024
 
-    # Don't know how to load an image from memory, so if the data is
-    # in a buffer or data URI, we'll write it to a temp file and use
-    # this to load it from the temp file's path.
-    # Yes, this is kind of a hack :)
-    def load_from_temp(path):
-        tex_image.image = load_image(path)
 
-        # Need to pack the image into the .blend file or it will go
-        # away as soon as the temp file is deleted.
-        tex_image.image.pack()  # TODO: decide on tradeoff for using as_png
+def create_image_from_memory(name, data):
+    """Create an image from the contents of an image file (PNG, JPEG, ...).
 
+    The data is packed into the .blend file as it is and Blender decodes
+    it from there, so nothing has to go through the filesystem.
+    """
+    data = bytes(data)
+    image = bpy.data.images.new(name, 8, 8)
+    image.pack(data=data, data_len=len(data))
+    image.source = 'FILE'
+    return image
+
+
+def read_image(source, base_path, view, data_uris, warm=False):
+    """Read the encoded contents of a glTF image.
+
+    view is the image's buffer view, if it is stored in one, and
+    data_uris is the DataURICache to decode data URIs with. Returns a
+    (key, data, path) triple. key says where the image came from (its
+    path or a hash of its contents) and is None if it couldn't be read.
+    For images in external files path is the file and data is None; the
+    file is only checked to be readable (and read through, if warm is
+    set, so Blender finds it in the OS cache). For embedded images data
+    is the contents of the image file.
+
+    This doesn't touch any Blender data, so it can run on a worker thread.
+    """
     if 'uri' in source:
         uri = source['uri']
         is_data_uri = uri[:5] == 'data:'
         if is_data_uri:
-            found_at = uri.find(';base64,')
-            if found_at == -1:
+            data = data_uris.decode(uri)
+            if data is None:
                 print("Couldn't read data URI; not base64?")
-            else:
-                buf = base64.b64decode(uri[found_at + 8:])
-                do_with_temp_file(buf, load_from_temp)
+                return (None, None, None)
         else:
-            image_location = os.path.join(op.base_path, uri)
-            tex_image.image = load_image(image_location)
+            path = os.path.normpath(os.path.join(base_path, uri))
+            try:
+                with open(path, 'rb') as f:
+                    while warm and f.read(WARM_CHUNK_SIZE):
+                        pass
+            except OSError as e:
+                print("Couldn't read image:", e)
+                return (None, None, None)
+            return (('path', path), None, path)
+    else:
+        data = view
 
-        tex_image.label = name
+    return (('sha1', hashlib.sha1(data).hexdigest()), data, None)
+
+
+def prefetch_image(source, base_path, view, data_uris, slots):
+    """read_image for prefetch_images.
+
+    Embedded images are only read if one of the slots is free, so only
+    so many are held decoded at once; otherwise this returns None and
+    create_image reads the image itself. create_image frees the slot.
+    """
+    if 'uri' in source and source['uri'][:5] != 'data:':
+        return read_image(source, base_path, view, data_uris, warm=True)
+    if not slots.acquire(blocking=False):
+        return None
+    try:
+        result = read_image(source, base_path, view, data_uris)
+    except BaseException:
+        slots.release()
+        raise
+    if result[1] is None:
+        slots.release()
+    return result
+
+
+def prefetch_images(op):
+    """Start reading all the images on a thread pool.
+
+    The results are picked up by create_image, so when the materials are
+    built the embedded images have already been decoded from their data
+    URIs and external image files have been read once, so they're in the
+    OS cache when Blender loads them. Only the bpy calls are left for the
+    main thread.
+    """
+    images = op.gltf.get('images', [])
+    if not images:
+        return
+
+    # Only images that some material will ask for; a prefetched image that
+    # never gets created would hold on to its data until the end
+    if op.reachable is not None:
+        used_idxs = op.reachable['images']
+    else:
+        used_idxs = reachability.find_used_images(op.gltf)
+
+    op.image_prefetch_slots = threading.BoundedSemaphore(PREFETCH_MAX_HELD)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=PREFETCH_THREADS)
+    for idx, source in enumerate(images):
+        if idx not in used_idxs:
+            continue
+        view = None
+        if 'uri' not in source:
+            # Fetch buffer views here; the op's caches aren't thread-safe.
+            view, _stride = op.get_buffer_view(source['bufferView'])
+        op.image_prefetch[idx] = executor.submit(
+            prefetch_image, source, op.base_path, view, op.decoded_data_uris, op.image_prefetch_slots,
+        )
+    # Don't wait; the futures finish on their own.
+    executor.shutdown(wait=False)
+
+
+def create_image(op, idx):
+    """Create the Blender image for images[idx].
+
+    Images are deduplicated by where they come from: external files by
+    path, data URIs and buffer views by a hash of their contents. A
+    second image with the same source reuses the first one's image.
+
+    External files are loaded by reference; only embedded images are
+    packed into the .blend file.
+    """
+    source = op.gltf['images'][idx]
+    name = source.get('name', 'images[%d]' % idx)
+
+    result = None
+    if idx in op.image_prefetch:
+        result = op.image_prefetch.pop(idx).result()
+        if result is not None and result[1] is not None:
+            op.image_prefetch_slots.release()
+    if result is None:
+        view = None
+        if 'uri' not in source:
+            view, _stride = op.get_buffer_view(source['bufferView'])
+        result = read_image(source, op.base_path, view, op.decoded_data_uris)
+    (key, data, path) = result
+    if source.get('uri', '')[:5] == 'data:':
+        # data is all that's needed from now on
+        op.decoded_data_uris.release(source['uri'])
+
+    if key is None:
+        return None
+
+    if key in op.images_by_source:
+        op.image_cache_stats['hits'] += 1
+        return op.images_by_source[key]
+    op.image_cache_stats['misses'] += 1
+
+    if path:
+        image = load_image(path)
+        if image is None:
+            return None
     else:
-        buf, _stride = op.get_buffer_view(source['bufferView'])
-        do_with_temp_file(buf, load_from_temp)
+        image = create_image_from_memory(name, data)
+
+    op.images_by_source[key] = image
+    return image
+
+
+def create_texture(op, idx, name, tree):
+    texture = op.gltf['textures'][idx]
+    source = op.gltf['images'][texture['source']]
+
+    tex_image = tree.nodes.new('ShaderNodeTexImage')
+    tex_image.image = op.get_image(texture['source'])
+    if 'uri' in source:
+        tex_image.label = name
 
     return tex_image
 
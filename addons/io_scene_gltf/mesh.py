@@ -1,29 +1,41 @@
 from functools import reduce
 
-import bmesh
 import bpy
+import numpy as np
 
+from io_scene_gltf import topology
 
-def primitive_to_mesh(op, primitive, all_attributes, material_index):
-    """Convert a glTF primitive object to a Blender mesh.
 
-    If you have one mesh that has some layer (texcoords, say) and
-    another that doesn't, when you merge them with bmesh it seems to
-    drop the layer. To prevent this, the all_attributes set contains
-    the union of all the attributes from the primitives for the (glTF)
-    mesh that this primitive is contained in so we can always create
-    enough layers.
+# The vertex attributes we know what to do with
+USED_ATTRIBUTES = [
+    'POSITION', 'NORMAL', 'COLOR_0', 'TEXCOORD_0', 'TEXCOORD_1',
+    'JOINTS_0', 'WEIGHTS_0', 'JOINTS_1', 'WEIGHTS_1',
+]
+
+
+def flat(array):
+    """Flatten an array into the contiguous float32/int32 form foreach_set likes."""
+    dtype = np.float32 if array.dtype.kind == 'f' else np.int32
+    return np.ascontiguousarray(array, dtype=dtype).reshape(-1)
+
+
+def decode_primitive(op, primitive):
+    """Decode the vertex data and topology of a glTF primitive.
+
+    Returns a dict mapping the primitive's attribute names to their
+    decoded arrays, plus 'edges' and 'faces' arrays indexing into them,
+    or None if the primitive has no POSITION data.
     """
-    me = bpy.data.meshes.new('{{{TEMP}}}')
     attributes = primitive['attributes']
 
     if 'POSITION' not in attributes:
-        # Early out if there's no POSITION data
-        return me
+        return None
 
-    verts = op.get_accessor(attributes['POSITION'])
-    edges = []
-    faces = []
+    prim = {
+        name: op.get_accessor(attributes[name])
+        for name in USED_ATTRIBUTES
+        if name in attributes
+    }
 
     # Generate the topology
 
@@ -32,145 +44,315 @@ def primitive_to_mesh(op, primitive, all_attributes, material_index):
     if 'indices' in primitive:
         indices = op.get_accessor(primitive['indices'])
     else:
-        indices = range(0, len(verts))
-
-    # TODO: only mode TRIANGLES is tested!!
-    if mode == 0:
-        # POINTS
-        pass
-    elif mode == 1:
-        # LINES
-        edges = [tuple(indices[i:i+2]) for i in range(0, len(indices), 2)]
-    elif mode == 2 or mode == 3:
-        # LINE LOOP/STRIP
-        edges = [tuple(indices[i:i+2]) for i in range(0, len(indices) - 1)]
-        if mode == 2:
-            edges.append((indices[-1], indices[0]))
-    elif mode == 4:
-        # TRIANGLES
-        #   2     3
-        #  / \   / \
-        # 0---1 4---5
-        faces = [tuple(indices[i:i+3]) for i in range(0, len(indices), 3)]
-    elif mode == 5:
-        # TRIANGLE STRIP
-        #   1---3---5
-        #  / \ / \ /
-        # 0---2---4
-        def alternate(i, xs):
-            ccw = i % 2 != 0
-            return xs if ccw else (xs[0], xs[2], xs[1])
-        faces = [
-            alternate(i, tuple(indices[i:i+3]))
-            for i in range(0, len(indices) - 2)
-        ]
-    elif mode == 6:
-        # TRIANGLE FAN
-        #   3---2
-        #  / \ / \
-        # 4---0---1
-        faces = [
-            (indices[0], indices[i], indices[i+1])
-            for i in range(1, len(indices) - 1)
-        ]
-    else:
-        raise Exception("primitive mode unimplemented: %d" % mode)
+        indices = np.arange(0, len(prim['POSITION']), dtype=np.uint32)
 
-    me.from_pydata(verts, edges, faces)
-    me.validate()
+    (prim['edges'], prim['faces']) = topology.primitive_topology(mode, indices)
+
+    # Morph targets; we only use their POSITION displacements
+    prim['targets'] = [
+        op.get_accessor(target['POSITION']) if 'POSITION' in target else None
+        for target in primitive.get('targets', [])
+    ]
+
+    return prim
+
+
+def concat_elems(prims, key, size):
+    """Concatenate the edges/faces of some primitives into one array.
+
+    Each primitive's vertex indices are offset by the start of its
+    vertices in the merged mesh.
+    """
+    arrays = [prim[key] + prim['vert_offset'] for prim in prims]
+    if not arrays:
+        return topology.empty(size)
+    return np.concatenate(arrays)
+
+
+def merge_attribute(prims, name, num_verts, width, default):
+    """Concatenate an attribute over some primitives.
+
+    Primitives that don't have the attribute get the default value.
+    Only the first width components are kept.
+    """
+    result = np.full((num_verts, width), default, dtype=np.float32)
+    for prim in prims:
+        if name in prim:
+            start = prim['vert_offset']
+            values = prim[name].reshape(len(prim[name]), -1)
+            result[start:start + len(values)] = values[:, :width]
+    return result
+
+
+def skin_weight_groups(joint_sets, weight_sets):
+    """Group the vertices of a skinned mesh by joint and weight.
 
-    # Assign material
-    for polygon in me.polygons:
-        polygon.material_index = material_index
+    joint_sets and weight_sets are lists of matching (num_verts, 4)
+    arrays, one pair for each JOINTS_n/WEIGHTS_n set. Returns a list of
+    (joint, weight, vertex_indices) batches. Zero weights are dropped and
+    a joint that appears more than once for the same vertex gets the sum
+    of its weights.
+    """
+    joints = np.concatenate(joint_sets, axis=1)
+    weights = np.concatenate(weight_sets, axis=1)
+    num_verts = len(joints)
+    verts = np.repeat(np.arange(0, num_verts), joints.shape[1])
+    joints = joints.reshape(-1)
+    weights = weights.reshape(-1)
+
+    keep = weights > 0
+    (verts, joints, weights) = (verts[keep], joints[keep], weights[keep])
+
+    # Sum duplicate (joint, vertex) pairs.
+    keys = joints.astype(np.int64) * num_verts + verts
+    (keys, first, inverse) = np.unique(keys, return_index=True, return_inverse=True)
+    weights = np.bincount(inverse.reshape(-1), weights=weights)
+    (verts, joints) = (verts[first], joints[first])
+
+    if len(verts) == 0:
+        return []
+
+    # Vertex groups store float32 weights, so vertices whose weights are
+    # equal as float32s can go into a group together at no loss.
+    weights = weights.astype(np.float32)
+
+    # Sort by (joint, weight) and cut into runs that share both.
+    order = np.lexsort((weights, joints))
+    (verts, joints, weights) = (verts[order], joints[order], weights[order])
+    starts = np.flatnonzero(
+        np.concatenate(([True], (joints[1:] != joints[:-1]) | (weights[1:] != weights[:-1])))
+    )
+    ends = np.append(starts[1:], len(verts))
+
+    return [
+        (int(joints[start]), float(weights[start]), verts[start:end])
+        for start, end in zip(starts, ends)
+    ]
+
+
+def assign_skin_weights(op, ob, mesh_idx):
+    """Put the vertices of a skinned mesh into ob's vertex groups.
+
+    ob must have one vertex group for each joint of its skin. The weights
+    are stored in the mesh, so this only needs doing once per mesh.
+    """
+    groups = op.mesh_skin_weights.pop(mesh_idx, [])
+    vertex_groups = ob.vertex_groups
+    for joint, weight, verts in groups:
+        if joint < len(vertex_groups):
+            vertex_groups[joint].add(verts.tolist(), weight, 'REPLACE')
+
+
+def create_shape_keys(op, ob, mesh_idx):
+    """Turn the morph targets of a mesh into shape keys.
+
+    Shape keys can only be added through an object, so this happens when
+    the first object using the mesh is created. The shape keys are
+    stored in the mesh, so this only needs doing once per mesh.
+    """
+    if mesh_idx not in op.mesh_morph_targets:
+        return
+    (names, weights, displacements) = op.mesh_morph_targets.pop(mesh_idx)
+
+    me = ob.data
+    co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get('co', co)
+
+    ob.shape_key_add('Basis')
+    for name, weight, displacement in zip(names, weights, displacements):
+        key_block = ob.shape_key_add(name)
+        key_block.data.foreach_set('co', co + displacement.reshape(-1))
+        key_block.value = weight
+
+
+def target_names(mesh):
+    """Return the morph target names in a mesh's extras.targetNames.
+
+    extras can be any JSON value, so anything other than an object with a
+    list of names there counts as no names.
+    """
+    extras = mesh.get('extras')
+    if not isinstance(extras, dict):
+        return []
+    names = extras.get('targetNames')
+    if not isinstance(names, list):
+        return []
+    return [str(name) for name in names]
 
-    # Assign normals
-    if 'NORMAL' in attributes:
-        normals = op.get_accessor(attributes['NORMAL'])
-        for i, vertex in enumerate(me.vertices):
-            vertex.normal = normals[i]
+
+def mesh_identity(mesh):
+    """Make a key describing what a glTF mesh is made of.
+
+    Meshes with equal keys reference the same accessors and materials in
+    the same way, so they'd turn into identical Blender meshes.
+    """
+    def primitive_identity(primitive):
+        return (
+            tuple(sorted(primitive['attributes'].items())),
+            primitive.get('indices'),
+            primitive.get('mode', 4),
+            primitive.get('material'),
+            tuple(tuple(sorted(target.items())) for target in primitive.get('targets', [])),
+        )
+    return (
+        tuple(primitive_identity(primitive) for primitive in mesh['primitives']),
+        tuple(mesh.get('weights', [])),
+        tuple(target_names(mesh)),
+    )
+
+
+def find_shared_meshes(op):
+    """Find the glTF meshes that can share a Blender mesh.
+
+    Fills op.mesh_instance_of, which maps every mesh index to the index of
+    the first mesh with the same content. Only that one gets created;
+    everything that uses the others uses it instead.
+    """
+    first_with_identity = {}
+    op.mesh_instance_of = []
+    for idx, mesh in enumerate(op.gltf.get('meshes', [])):
+        canonical_idx = first_with_identity.setdefault(mesh_identity(mesh), idx)
+        op.mesh_instance_of.append(canonical_idx)
+        if canonical_idx != idx:
+            op.profiler.count('meshesShared')
+
+
+def create_mesh(op, idx):
+    mesh = op.gltf['meshes'][idx]
+    name = mesh.get('name', 'meshes[%d]' % idx)
+    primitives = mesh['primitives']
+    me = bpy.data.meshes.new(name)
+
+    # Find the union of the attributes used by each primitive. Every
+    # layer in it gets created on the mesh, even when only some of the
+    # primitives fill it in.
+    attributes = (set(primitive['attributes'].keys()) for primitive in primitives)
+    all_attributes = reduce(lambda x, y: x.union(y), attributes)
+
+    # Decode all the primitives and lay their vertices out one after
+    # another; the whole mesh is then written in one go.
+    prims = []
+    num_verts = 0
+    for i, primitive in enumerate(primitives):
+        prim = decode_primitive(op, primitive)
+        if prim is None:
+            continue
+        prim['material_index'] = i
+        prim['vert_offset'] = num_verts
+        num_verts += len(prim['POSITION'])
+        prims.append(prim)
+
+    verts = merge_attribute(prims, 'POSITION', num_verts, 3, 0)
+    edges = concat_elems(prims, 'edges', 2)
+    faces = concat_elems(prims, 'faces', 3)
+    material_indices = np.concatenate(
+        [np.full(len(prim['faces']), prim['material_index'], dtype=np.int32) for prim in prims] or
+        [np.zeros(0, dtype=np.int32)]
+    )
+
+    # Build the mesh in bulk with foreach_set. Every polygon is a
+    # triangle, so loop i of the mesh is corner i of the flattened
+    # faces array and per-loop data can be gathered with it.
+    loop_verts = faces.reshape(-1)
+    num_faces = len(faces)
+    num_loops = len(loop_verts)
+
+    me.vertices.add(num_verts)
+    me.vertices.foreach_set('co', flat(verts))
+    me.edges.add(len(edges))
+    me.edges.foreach_set('vertices', flat(edges))
+    me.loops.add(num_loops)
+    me.loops.foreach_set('vertex_index', loop_verts)
+    me.polygons.add(num_faces)
+    me.polygons.foreach_set('loop_start', np.arange(0, num_loops, 3, dtype=np.int32))
+    me.polygons.foreach_set('loop_total', np.full(num_faces, 3, dtype=np.int32))
+
+    # Assign materials
+    me.polygons.foreach_set('material_index', material_indices)
+
+    # TODO: Do we need this?
+    me.polygons.foreach_set('use_smooth', np.ones(num_faces, dtype=bool))
 
     # Assign colors
     if 'COLOR_0' in all_attributes:
-        me.vertex_colors.new('COLOR_0')
-    if 'COLOR_0' in attributes:
-        colors = op.get_accessor(attributes['COLOR_0'])
-        if colors and len(colors[0]) == 4:
+        if any(prim['COLOR_0'].shape[1] == 4 for prim in prims if 'COLOR_0' in prim):
             print(
                 'WARNING! This glTF uses RGBA vertex colors. Blender only supports '
                 'RGB vertex colors. The alpha component will be discarded.'
             )
 
-        color_layer = me.vertex_colors[0].data
-        for polygon in me.polygons:
-            for vert_idx, loop_idx in zip(polygon.vertices, polygon.loop_indices):
-                color_layer[loop_idx].color = colors[vert_idx][0:3]
+        colors = merge_attribute(prims, 'COLOR_0', num_verts, 3, 1)
+        me.vertex_colors.new('COLOR_0')
+        me.vertex_colors[0].data.foreach_set('color', flat(colors[loop_verts]))
 
     # Assign texcoords
-    def assign_texcoords(uvs, uv_layer):
-        for polygon in me.polygons:
-            for vert_idx, loop_idx in zip(polygon.vertices, polygon.loop_indices):
-                uv = uvs[vert_idx]
-                uv_layer[loop_idx].uv = (uv[0], -uv[1])
+    def assign_texcoords(name, uv_layer):
+        uvs = merge_attribute(prims, name, num_verts, 2, 0)
+        loop_uvs = uvs[loop_verts]
+        loop_uvs[:, 1] *= -1
+        uv_layer.foreach_set('uv', flat(loop_uvs))
     if 'TEXCOORD_0' in all_attributes or 'TEXCOORD_1' in all_attributes:
         me.uv_textures.new('TEXCOORD_0')
+        assign_texcoords('TEXCOORD_0', me.uv_layers[0].data)
     if 'TEXCOORD_1' in all_attributes:
         me.uv_textures.new('TEXCOORD_1')
-    if 'TEXCOORD_0' in attributes:
-        assign_texcoords(op.get_accessor(attributes['TEXCOORD_0']), me.uv_layers[0].data)
-    if 'TEXCOORD_1' in attributes:
-        assign_texcoords(op.get_accessor(attributes['TEXCOORD_1']), me.uv_layers[1].data)
-
-    # Assign joints by generating vertex groups
-    if 'JOINTS_0' in attributes and 'WEIGHTS_0' in attributes:
-        # Don't seem to need to deal with all_attributes here.
-        # The only way I could find to set vertex groups was by
-        # round-tripping through a bmesh.
-        # TODO: find a better way?
-        joints = op.get_accessor(attributes['JOINTS_0'])
-        weights = op.get_accessor(attributes['WEIGHTS_0'])
-        bme = bmesh.new()
-        bme.from_mesh(me)
-        layer = bme.verts.layers.deform.new('JOINTS_0')
-        for vert, joint_vec, weight_vec in zip(bme.verts, joints, weights):
-            for joint, weight in zip(joint_vec, weight_vec):
-                vert[layer][joint] = weight
-        bme.to_mesh(me)
-        bme.free()
-
-    me.update()
-
-    return me
+        assign_texcoords('TEXCOORD_1', me.uv_layers[1].data)
 
+    # Only validate once all the per-loop data is in, so anything
+    # validate removes takes its loop data with it.
+    me.update(calc_edges=True)
+    me.validate()
 
-def create_mesh(op, idx):
-    mesh = op.gltf['meshes'][idx]
-    name = mesh.get('name', 'meshes[%d]' % idx)
-    primitives = mesh['primitives']
-    me = bpy.data.meshes.new(name)
+    # Assign normals. Primitives without normals keep the ones Blender
+    # calculated for them.
+    if 'NORMAL' in all_attributes:
+        normals = np.empty(num_verts * 3, dtype=np.float32)
+        me.vertices.foreach_get('normal', normals)
+        normals = normals.reshape(num_verts, 3)
+        for prim in prims:
+            if 'NORMAL' in prim:
+                start = prim['vert_offset']
+                normals[start:start + len(prim['NORMAL'])] = prim['NORMAL']
+        me.vertices.foreach_set('normal', flat(normals))
 
-    # Find the union of the attributes used by each primitive.
-    attributes = (set(primitive['attributes'].keys()) for primitive in primitives)
-    all_attributes = reduce(lambda x, y: x.union(y), attributes)
+    # Collect the skin weights; they're put into vertex groups once an
+    # object with the skin's joints as vertex groups uses this mesh.
+    joint_sets = []
+    weight_sets = []
+    for n in range(0, 2):
+        if 'JOINTS_%d' % n in all_attributes and 'WEIGHTS_%d' % n in all_attributes:
+            joints = merge_attribute(prims, 'JOINTS_%d' % n, num_verts, 4, 0)
+            weights = merge_attribute(prims, 'WEIGHTS_%d' % n, num_verts, 4, 0)
+            joint_sets.append(joints.astype(np.int32))
+            weight_sets.append(weights)
+    if joint_sets:
+        op.mesh_skin_weights[idx] = skin_weight_groups(joint_sets, weight_sets)
 
-    bme = bmesh.new()
-    for i, primitive in enumerate(mesh['primitives']):
-        tmp_mesh = primitive_to_mesh(op, primitive, all_attributes, material_index=i)
-        bme.from_mesh(tmp_mesh)
-        bpy.data.meshes.remove(tmp_mesh)
-    bme.to_mesh(me)
-    bme.free()
+    # Collect the morph targets; they become shape keys once an object
+    # uses this mesh (see create_shape_keys).
+    num_targets = max([len(prim['targets']) for prim in prims] or [0])
+    if num_targets:
+        displacements = np.zeros((num_targets, num_verts, 3), dtype=np.float32)
+        for prim in prims:
+            start = prim['vert_offset']
+            for i, target in enumerate(prim['targets']):
+                if target is not None:
+                    displacements[i, start:start + len(target)] = target
+        names = target_names(mesh)
+        names = [
+            names[i] if i < len(names) else 'targets[%d]' % i
+            for i in range(0, num_targets)
+        ]
+        weights = mesh.get('weights', [0] * num_targets)
+        op.mesh_morph_targets[idx] = (names, weights, displacements)
 
-    for primitive in mesh['primitives']:
+    for primitive in primitives:
         if 'material' in primitive:
             material = op.get_material(primitive['material'])
         else:
             material = op.get_default_material()
         me.materials.append(material)
 
-    # TODO: Do we need this?
-    for polygon in me.polygons:
-        polygon.use_smooth = True
-
     me.update()
 
     return me
@@ -1,5 +1,8 @@
 import bpy
-from mathutils import Matrix, Quaternion, Vector
+import numpy as np
+from mathutils import Matrix
+
+from io_scene_gltf import instancing, mesh
 
 """
 Handle nodes and scenes.
@@ -22,6 +25,10 @@ It would also be desirable to check that what we do gives the correst result ie.
 the transform Blender does equals the one glTF calls for, but neither Blender
 nor glTF have docs for exactly what that transform should be :-/
 
+The node forest is walked breadth first with an explicit queue rather than
+by recursion, so hierarchies of any depth work, and the world matrices of
+all the nodes are computed up front with numpy.
+
 Scenes are represented by Blender scene. Each one has the whole node armature
 linked in, but only has those meshes and cameras linked in that are "visible" in
 that scene (ie. are descendants of one of the roots of the scene).
@@ -35,32 +42,70 @@ def convert_matrix(m):
     return result
 
 
-def convert_quaternion(q):
-    """Converts a glTF quaternion to Blender a quaternion."""
-    # xyzw -> wxyz
-    return Quaternion([q[3], q[0], q[1], q[2]])
-
-
-def get_transform(node):
-    if 'matrix' in node:
-        return convert_matrix(node['matrix'])
-    else:
-        mat = Matrix()
-        if 'scale' in node:
-            s = node['scale']
-            mat = Matrix([
-                [s[0], 0, 0, 0],
-                [0, s[1], 0, 0],
-                [0, 0, s[2], 0],
-                [0, 0, 0, 1]
-            ])
-        if 'rotation' in node:
-            q = convert_quaternion(node['rotation'])
-            mat = q.to_matrix().to_4x4() * mat
-        if 'translation' in node:
-            t = Vector(node['translation'])
-            mat = Matrix.Translation(t) * mat
-        return mat
+def local_matrices(nodes):
+    """Return an (N, 4, 4) array of the local transforms of the nodes."""
+    n = len(nodes)
+
+    def gather(prop, default):
+        values = [node.get(prop, default) for node in nodes]
+        return np.array(values, dtype=np.float64).reshape(n, len(default))
+    translations = gather('translation', (0, 0, 0))
+    rotations = gather('rotation', (0, 0, 0, 1))
+    scales = gather('scale', (1, 1, 1))
+
+    mats = np.zeros((n, 4, 4))
+    # T R S; scaling the columns of R is R S
+    mats[:, :3, :3] = instancing.quaternions_to_matrices(rotations) * scales[:, np.newaxis, :]
+    mats[:, :3, 3] = translations
+    mats[:, 3, 3] = 1
+
+    for i, node in enumerate(nodes):
+        if 'matrix' in node:
+            # column-major
+            mats[i] = np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    return mats
+
+
+def traverse(nodes, root_idxs):
+    """Walk the node forest breadth first.
+
+    Returns arrays (node_idxs, parent_idxs, root_idxs) listing the nodes
+    in the order they were visited, so every node comes after its parent.
+    The parents of the roots are -1.
+    """
+    order = [(idx, -1, idx) for idx in root_idxs]
+    i = 0
+    while i < len(order):
+        (idx, _, root_idx) = order[i]
+        for child_idx in nodes[idx].get('children', []):
+            order.append((child_idx, idx, root_idx))
+        i += 1
+    if not order:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(0, 3))
+    return tuple(np.array(column, dtype=np.int64) for column in zip(*order))
+
+
+def world_matrices(nodes, node_idxs, parent_idxs):
+    """Return an (N, 4, 4) array of the transforms of the nodes relative
+    to the root of the forest.
+
+    This uses pointer jumping: world[i] starts out as the transform from
+    node i's parent to node i, and each step multiplies it by that of the
+    ancestor it stops at, doubling the number of levels it spans. A chain
+    of N nodes takes log2(N) vectorized steps.
+    """
+    n = len(nodes)
+    # Row n is the identity; it stands in for the ancestor of a node whose
+    # world matrix is done, so every step can work on all the nodes at once.
+    world = np.empty((n + 1, 4, 4))
+    world[:n] = local_matrices(nodes)
+    world[n] = np.identity(4)
+    ancestors = np.full(n + 1, n, dtype=np.int64)
+    ancestors[node_idxs] = np.where(parent_idxs == -1, n, parent_idxs)
+    while np.any(ancestors != n):
+        world = np.einsum('nij,njk->nik', world[ancestors], world)
+        ancestors = ancestors[ancestors]
+    return world[:n]
 
 
 def create_objects(op, idx, root_idx):
@@ -89,13 +134,32 @@ def create_objects(op, idx, root_idx):
         mesh_name = name
         if 'camera' in node:
             mesh_name += '.mesh'
-        ob = create(mesh_name, op.get_mesh(node['mesh']))
+        # Meshes with the same content share one Blender mesh
+        mesh_idx = op.mesh_instance_of[node['mesh']]
+        gpu_instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing')
+        if gpu_instancing:
+            # The object is drawn on each face of an instancer mesh; see
+            # instancing.py
+            instancer_mesh = instancing.create_instancer_mesh(op, name + '.instances', gpu_instancing)
+            op.uses.release(op, ('node', idx))
+            instancer = create(name + '.instances', instancer_mesh)
+            ob = bpy.data.objects.new(mesh_name, op.get_mesh(mesh_idx))
+            instancing.make_instancer(instancer, ob)
+            op.root_to_objects[root_idx].append(ob)
+        else:
+            ob = create(mesh_name, op.get_mesh(mesh_idx))
+        mesh.create_shape_keys(op, ob, mesh_idx)
 
         if 'skin' in node:
             skin = op.gltf['skins'][node['skin']]
             joints = skin['joints']
             for joint in joints:
-                ob.vertex_groups.new(op.node_to_bone_name[joint])
+                # Joints outside the imported scene have no bone; name the
+                # group the way the bone would be named
+                default_name = op.gltf['nodes'][joint].get('name', 'node[%d]' % joint)
+                ob.vertex_groups.new(op.node_to_bone_name.get(joint, default_name))
+
+            mesh.assign_skin_weights(op, ob, mesh_idx)
 
             mod = ob.modifiers.new('rig', 'ARMATURE')
             mod.object = op.armature_ob
@@ -107,16 +171,17 @@ def create_objects(op, idx, root_idx):
             camera_name += '.camera'
         create(camera_name, op.get_camera(node['camera']))
 
-    for idx in node.get('children', []):
-        create_objects(op, idx, root_idx)
-
 
 def find_root_idxs(op):
     nodes = op.gltf.get('nodes', [])
-    idxs = set(range(0, len(nodes)))
-    for node in nodes:
-        for child_idx in node.get('children', []):
-            idxs.remove(child_idx)
+    if op.scene_idx is not None:
+        # Only the trees of the scene being imported
+        idxs = set(op.gltf['scenes'][op.scene_idx].get('nodes', []))
+    else:
+        idxs = set(range(0, len(nodes)))
+        for node in nodes:
+            for child_idx in node.get('children', []):
+                idxs.remove(child_idx)
     root_idxs = list(idxs)
     root_idxs.sort()
     op.root_idxs = root_idxs
@@ -126,12 +191,9 @@ def find_root_idxs(op):
 
 
 def generate_armature_object(op):
-    bpy.ops.object.add(type='ARMATURE', enter_editmode=True)
-    arma_ob = bpy.context.object
-    arma_ob.name = 'Node Forest'
+    arma = bpy.data.armatures.new('Node Forest')
+    arma_ob = bpy.data.objects.new('Node Forest', arma)
     arma_ob.show_x_ray = True
-    arma = arma_ob.data
-    arma.name = 'Node Forest'
     op.armature_ob = arma_ob
 
     # Turn glTF up (+Y) into Blender up (+Z)
@@ -143,70 +205,93 @@ def generate_armature_object(op):
         [0, 0, 0, 1]
     ])
 
-    def add_bone(idx, parent, parent_mat):
-        node = op.gltf['nodes'][idx]
-        name = node.get('name', 'node[%d]' % idx)
-        # Urg, isn't this backwards from get_transform? Figure out why.
-        mat = parent_mat * get_transform(node)
-
-        bone = arma.edit_bones.new(name)
-        bone.use_connect = False
-        if parent:
-            bone.parent = parent
-        bone.head = mat * Vector((0, 0, 0))
-        bone.tail = mat * Vector((0, 1, 0))
-        bone.align_roll(mat * Vector((0, 0, 1)) - bone.head)
-        # NOTE: bones don't seem to have non-uniform scaling.
-        # This appears to be a serious problem for us.
-
-        op.node_to_bone_name[idx] = bone.name
-
-        children = node.get('children', [])
-        for child_idx in children:
-            add_bone(child_idx, bone, mat)
-
-    for root_idx in op.root_idxs:
-        add_bone(root_idx, None, Matrix())
-    # Done with bones; node_to_bone_name is filled out.
-    # Now create objects.
-    for root_idx in op.root_idxs:
-        create_objects(op, root_idx, root_idx)
+    # Bones can only be added in edit mode, and only to an armature that's
+    # linked into the current scene and active. This is the one time the
+    # import goes through an operator; all the bones are added in this
+    # single edit mode session.
+    context_scene = bpy.context.scene
+    context_scene.objects.link(arma_ob)
+    context_scene.objects.active = arma_ob
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    nodes = op.gltf.get('nodes', [])
+    with op.profiler.stage('armature'):
+        (node_idxs, parent_idxs, root_idxs) = traverse(nodes, op.root_idxs)
+        world = world_matrices(nodes, node_idxs, parent_idxs)
+        # Bone head, tail (the node's +Y) and roll axis (its +Z)
+        heads = world[:, :3, 3]
+        tails = heads + world[:, :3, 1]
+        roll_axes = world[:, :3, 2]
+
+        bones = {}
+        for (idx, parent_idx) in zip(node_idxs.tolist(), parent_idxs.tolist()):
+            node = nodes[idx]
+            name = node.get('name', 'node[%d]' % idx)
+
+            bone = arma.edit_bones.new(name)
+            bone.use_connect = False
+            if parent_idx != -1:
+                bone.parent = bones[parent_idx]
+            bone.head = heads[idx].tolist()
+            bone.tail = tails[idx].tolist()
+            bone.align_roll(roll_axes[idx].tolist())
+            # NOTE: bones don't seem to have non-uniform scaling.
+            # This appears to be a serious problem for us.
+
+            bones[idx] = bone
+            op.node_to_bone_name[idx] = bone.name
 
     bpy.ops.object.mode_set(mode='OBJECT')
 
-    # Linking it in, AFAICT, was necessary to enter edit mode for the above. But
-    # create_scene is going to be responsible for linking it into each scene,
-    # and linking it where it's already linked throws an error, so we unlink it
-    # here for now.
-    bpy.context.scene.objects.unlink(arma_ob)
+    # The scenes we create link the armature in themselves, so take it back
+    # out of the current one.
+    context_scene.objects.unlink(arma_ob)
+
+    # Done with bones; node_to_bone_name is filled out.
+    # Now create objects.
+    with op.profiler.stage('objects'):
+        for (idx, root_idx) in zip(node_idxs.tolist(), root_idxs.tolist()):
+            create_objects(op, idx, root_idx)
 
 
 def create_scene(op, idx):
     scene = op.gltf['scenes'][idx]
     name = scene.get('name', 'scene[%d]' % idx)
 
-    bpy.ops.scene.new(type='NEW')
-    scn = bpy.context.scene
-    scn.name = name
+    scn = bpy.data.scenes.new(name)
     scn.render.engine = 'CYCLES'
     # scn.world.use_nodes = True
 
-    # Always link in the whole node forest
-    scn.objects.link(op.armature_ob)
+    return scn
+
 
-    roots = scene.get('nodes', [])
-    for root_idx in roots:
-        # Link in any objects in this tree
-        for ob in op.root_to_objects[root_idx]:
-            scn.objects.link(ob)
+def link_scene_objects(op, idx):
+    """Link the objects visible in a scene into its Blender scene."""
+    scene = op.gltf['scenes'][idx]
+    scn = op.scenes[idx]
 
-    return scn
+    # Always link in the whole node forest, plus the objects in the trees
+    # of the scene's roots
+    objects = [op.armature_ob]
+    for root_idx in scene.get('nodes', []):
+        objects += op.root_to_objects[root_idx]
+
+    link = scn.objects.link
+    for ob in objects:
+        link(ob)
 
 
 def generate_scenes(op):
     find_root_idxs(op)
     generate_armature_object(op)
 
-    scenes = op.gltf.get('scenes', [])
-    for scene_idx in range(0, len(scenes)):
-        op.scenes[scene_idx] = create_scene(op, scene_idx)
+    if op.scene_idx is not None:
+        scene_idxs = [op.scene_idx]
+    else:
+        scene_idxs = range(0, len(op.gltf.get('scenes', [])))
+    with op.profiler.stage('scenes'):
+        for scene_idx in scene_idxs:
+            op.scenes[scene_idx] = create_scene(op, scene_idx)
+        # All the objects exist now; link them in one pass
+        for scene_idx in scene_idxs:
+            link_scene_objects(op, scene_idx)
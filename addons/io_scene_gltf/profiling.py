@@ -0,0 +1,124 @@
+import cProfile
+import json
+from collections import OrderedDict
+from timeit import default_timer as timer
+
+"""
+Optional instrumentation for imports.
+
+The importer wraps each stage of an import (loading, decoding accessors,
+building meshes, ...) in Profiler.stage and bumps counters with
+Profiler.count. Stages nest, eg. accessors are decoded while building
+meshes, so each stage gets both its timeElapsed, which includes the time
+of any stages inside it, and its selfTime, which doesn't. The self times
+add up to the time spent in stages, so they're what compare_stages uses
+to tell which stage got slower.
+
+A disabled profiler does nothing, so the importer can use one
+unconditionally.
+"""
+
+
+class NullStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+class Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        # Time spent in stages inside this one
+        self.inner_time = 0.0
+        self.profiler.active.append(self)
+        self.start = timer()
+
+    def __exit__(self, *args):
+        elapsed = timer() - self.start
+        self.profiler.active.pop()
+        if self.profiler.active:
+            self.profiler.active[-1].inner_time += elapsed
+        stage = self.profiler.stages.setdefault(
+            self.name, {'timeElapsed': 0.0, 'selfTime': 0.0, 'calls': 0},
+        )
+        stage['timeElapsed'] += elapsed
+        stage['selfTime'] += elapsed - self.inner_time
+        stage['calls'] += 1
+
+
+class Profiler:
+    """Collects per-stage timings and counters for an import."""
+
+    def __init__(self, enabled=False, use_cprofile=False):
+        self.enabled = enabled
+        self.stages = OrderedDict()
+        # The stages that are running, innermost last
+        self.active = []
+        self.counters = OrderedDict()
+        self.cprofile = cProfile.Profile() if enabled and use_cprofile else None
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = timer()
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile:
+            self.cprofile.disable()
+        self.end_time = timer()
+
+    def stage(self, name):
+        """Return a context manager that times a stage of the import."""
+        if not self.enabled:
+            return NullStage()
+        return Stage(self, name)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        return {
+            'timeElapsed': self.end_time - self.start_time,
+            'stages': self.stages,
+            'counters': self.counters,
+        }
+
+    def write(self, path):
+        """Write the report to path as JSON.
+
+        The cProfile stats, if they were collected, go next to it in
+        path + '.prof'.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+        if self.cprofile:
+            self.cprofile.dump_stats(path + '.prof')
+
+
+def compare_stages(old_report, new_report):
+    """Compare the stages of two reports by their self time.
+
+    Returns a list of (stage, old self time, new self time) for the stages
+    in either report, the one that got the most slower first. A stage
+    missing from a report took 0 seconds there.
+    """
+    (old_stages, new_stages) = (old_report['stages'], new_report['stages'])
+    names = list(old_stages) + [name for name in new_stages if name not in old_stages]
+    rows = [
+        (
+            name,
+            old_stages.get(name, {}).get('selfTime', 0.0),
+            new_stages.get(name, {}).get('selfTime', 0.0),
+        )
+        for name in names
+    ]
+    rows.sort(key=lambda row: row[2] - row[1], reverse=True)
+    return rows
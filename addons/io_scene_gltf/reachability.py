@@ -0,0 +1,86 @@
+"""
+Find what a scene uses.
+
+When only one scene is imported, only the nodes in its trees get bones
+and objects, and only the meshes, materials, textures, images, skins and
+animations that those nodes (transitively) refer to are needed. Since
+meshes and materials are built on demand, most of this follows on its
+own; the sets found here are for the things that would otherwise be done
+for the whole file up front, like prefetching images and creating
+actions.
+"""
+
+
+def find_texture_idxs(obj, result):
+    """Collect the indices of the textures a material refers to.
+
+    Texture references are the objects under a '...Texture' key (eg.
+    baseColorTexture, or diffuseTexture in an extension).
+    """
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key.endswith('Texture') and isinstance(value, dict) and 'index' in value:
+                result.add(value['index'])
+            find_texture_idxs(value, result)
+    elif isinstance(obj, list):
+        for value in obj:
+            find_texture_idxs(value, result)
+
+
+def find_used_by_meshes(gltf, mesh_idxs, result):
+    """Add the indices of the materials, textures and images the meshes
+    use to the 'materials', 'textures' and 'images' sets in result.
+    """
+    for mesh_idx in mesh_idxs:
+        for primitive in gltf['meshes'][mesh_idx]['primitives']:
+            if 'material' in primitive:
+                result['materials'].add(primitive['material'])
+
+    for material_idx in result['materials']:
+        find_texture_idxs(gltf['materials'][material_idx], result['textures'])
+
+    for texture_idx in result['textures']:
+        texture = gltf['textures'][texture_idx]
+        if 'source' in texture:
+            result['images'].add(texture['source'])
+
+
+def find_used_images(gltf):
+    """Return the set of indices of the images that the materials of any
+    mesh use (through their textures).
+    """
+    used = {'materials': set(), 'textures': set(), 'images': set()}
+    find_used_by_meshes(gltf, range(0, len(gltf.get('meshes', []))), used)
+    return used['images']
+
+
+def find_reachable(gltf, scene_idx):
+    """Return a dict mapping 'nodes', 'meshes', 'cameras', 'skins',
+    'materials', 'textures', 'images' and 'animations' to the sets of
+    indices of those that the scene uses.
+    """
+    nodes = gltf.get('nodes', [])
+    reachable = {
+        key: set()
+        for key in ['nodes', 'meshes', 'cameras', 'skins', 'materials', 'textures', 'images', 'animations']
+    }
+
+    stack = list(gltf['scenes'][scene_idx].get('nodes', []))
+    while stack:
+        idx = stack.pop()
+        if idx in reachable['nodes']:
+            continue
+        reachable['nodes'].add(idx)
+        node = nodes[idx]
+        for key, prop in [('meshes', 'mesh'), ('cameras', 'camera'), ('skins', 'skin')]:
+            if prop in node:
+                reachable[key].add(node[prop])
+        stack += node.get('children', [])
+
+    find_used_by_meshes(gltf, reachable['meshes'], reachable)
+
+    for anim_idx, anim in enumerate(gltf.get('animations', [])):
+        if any(channel['target'].get('node') in reachable['nodes'] for channel in anim['channels']):
+            reachable['animations'].add(anim_idx)
+
+    return reachable
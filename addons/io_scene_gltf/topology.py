@@ -0,0 +1,109 @@
+import numpy as np
+
+"""
+Generate the topology for the glTF primitive modes.
+
+Each function takes the flat array of vertex indices of a primitive and
+returns an int32 array of edges, shape (n, 2), or of triangles, shape
+(n, 3). Everything is done with whole-array operations, so none of this
+loops over the indices in Python. Degenerate edges and triangles (ones
+that use the same vertex more than once) are dropped; strips use them to
+restart and Blender wouldn't keep them anyway.
+"""
+
+
+def empty(size):
+    return np.zeros((0, size), dtype=np.int32)
+
+
+def remove_degenerate(elems):
+    keep = elems[:, 0] != elems[:, 1]
+    if elems.shape[1] == 3:
+        keep &= elems[:, 1] != elems[:, 2]
+        keep &= elems[:, 2] != elems[:, 0]
+    return elems[keep]
+
+
+def lines(indices):
+    #  0---1  2---3
+    n = len(indices) // 2 * 2
+    edges = indices[:n].reshape(-1, 2)
+    return remove_degenerate(edges.astype(np.int32))
+
+
+def line_strip(indices):
+    #  0---1---2---3
+    if len(indices) < 2:
+        return empty(2)
+    edges = np.column_stack((indices[:-1], indices[1:]))
+    return remove_degenerate(edges.astype(np.int32))
+
+
+def line_loop(indices):
+    #  0---1---2---3
+    #  |___________|
+    if len(indices) < 2:
+        return empty(2)
+    edges = np.column_stack((indices, np.roll(indices, -1)))
+    return remove_degenerate(edges.astype(np.int32))
+
+
+def triangles(indices):
+    #   2     5
+    #  / \   / \
+    # 0---1 3---4
+    n = len(indices) // 3 * 3
+    faces = indices[:n].reshape(-1, 3)
+    return remove_degenerate(faces.astype(np.int32))
+
+
+def triangle_strip(indices):
+    #   1---3---5
+    #  / \ / \ /
+    # 0---2---4
+    #
+    # Every other triangle has its winding flipped so they all face the
+    # same way; triangle i is (i, i + 1 + i%2, i + 2 - i%2).
+    if len(indices) < 3:
+        return empty(3)
+    i = np.arange(0, len(indices) - 2)
+    odd = i % 2
+    faces = np.column_stack((indices[i], indices[i + 1 + odd], indices[i + 2 - odd]))
+    return remove_degenerate(faces.astype(np.int32))
+
+
+def triangle_fan(indices):
+    #   3---2
+    #  / \ / \
+    # 4---0---1
+    if len(indices) < 3:
+        return empty(3)
+    first = np.full(len(indices) - 2, indices[0], dtype=indices.dtype)
+    faces = np.column_stack((first, indices[1:-1], indices[2:]))
+    return remove_degenerate(faces.astype(np.int32))
+
+
+def primitive_topology(mode, indices):
+    """Return the (edges, faces) arrays for a primitive of the given mode."""
+    edges = empty(2)
+    faces = empty(3)
+
+    if mode == 0:
+        # POINTS
+        pass
+    elif mode == 1:
+        edges = lines(indices)
+    elif mode == 2:
+        edges = line_loop(indices)
+    elif mode == 3:
+        edges = line_strip(indices)
+    elif mode == 4:
+        faces = triangles(indices)
+    elif mode == 5:
+        faces = triangle_strip(indices)
+    elif mode == 6:
+        faces = triangle_fan(indices)
+    else:
+        raise Exception("primitive mode unimplemented: %d" % mode)
+
+    return (edges, faces)
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+"""Benchmark the decoding and parsing layers of the importer.
+
+This runs with a plain Python interpreter (with numpy); Blender's modules
+are replaced by the stand-ins in unit/blender_stub.py. Each benchmark
+runs on synthetic data of a configurable size and reports its throughput
+in MB/s and elements/s (the best of several repeats).
+
+Results can be saved as a baseline and later runs compared against it.
+
+With --scaling, it instead generates scenes of growing size with
+gltf_generator.py and reports how the time and (Python heap) memory
+needed to load and decode them grow.
+
+Possible exit codes are:
+
+0 - No regressions (or nothing to compare against)
+1 - Some kind of error occurred
+3 - At least one benchmark got slower than the baseline allows
+
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from timeit import default_timer as timer
+
+import numpy as np
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(base_dir, 'unit'))
+
+import blender_stub  # noqa: E402
+blender_stub.install()
+
+from fixtures import load_op, make_glb, make_glb_op, make_op  # noqa: E402
+from io_scene_gltf import animation, buffer, datauri, mesh, node, topology  # noqa: E402
+import gltf_generator  # noqa: E402
+
+
+baseline_path = os.path.join(base_dir, 'benchmark_baseline.json')
+
+# (nodes, total vertices) of the scenes used for --scaling
+SCALING_STEPS = [
+    (1000, 10000),
+    (10000, 100000),
+    (100000, 1000000),
+    (1000000, 10000000),
+    (1000000, 50000000),
+]
+
+COMPONENT_SIZES = {5120: 1, 5121: 1, 5122: 2, 5123: 2, 5125: 4, 5126: 4}
+# (columns, rows) of each accessor type
+SHAPES = {
+    'SCALAR': (1, 1), 'VEC2': (1, 2), 'VEC3': (1, 3), 'VEC4': (1, 4),
+    'MAT2': (2, 2), 'MAT3': (3, 3), 'MAT4': (4, 4),
+}
+
+
+def random_bytes(size, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def measure(func, repeat):
+    """Return the best time out of repeat calls to func."""
+    best = float('inf')
+    for _ in range(0, repeat):
+        start = timer()
+        func()
+        best = min(best, timer() - start)
+    return best
+
+
+def result(name, seconds, num_bytes, num_elements):
+    return {
+        'name': name,
+        'timeElapsed': seconds,
+        'mbPerSecond': num_bytes / seconds / 1e6,
+        'elementsPerSecond': num_elements / seconds,
+    }
+
+
+def element_size(ty, component_type):
+    """Size of an accessor element, including the padding of matrix columns."""
+    (columns, rows) = SHAPES[ty]
+    column_size = rows * COMPONENT_SIZES[component_type]
+    if columns > 1:
+        column_size = (column_size + 3) // 4 * 4
+    return columns * column_size
+
+
+def accessor_case(count, ty, component_type, stride=None, normalized=False, sparse_count=0):
+    """Make an op with one accessor (and its data) in a GLB buffer."""
+    elem_size = element_size(ty, component_type)
+    stride = stride or elem_size
+    data = random_bytes(count * stride)
+
+    buffer_views = [{'buffer': 0, 'byteLength': len(data)}]
+    if stride != elem_size:
+        buffer_views[0]['byteStride'] = stride
+    accessor = {
+        'bufferView': 0,
+        'componentType': component_type,
+        'count': count,
+        'type': ty,
+        'normalized': normalized,
+    }
+
+    if sparse_count:
+        rng = np.random.RandomState(1)
+        indices = np.sort(rng.choice(count, sparse_count, replace=False)).astype('<u4').tobytes()
+        values = random_bytes(sparse_count * elem_size, seed=2)
+        buffer_views.append({'buffer': 0, 'byteOffset': len(data), 'byteLength': len(indices)})
+        buffer_views.append({
+            'buffer': 0,
+            'byteOffset': len(data) + len(indices),
+            'byteLength': len(values),
+        })
+        accessor['sparse'] = {
+            'count': sparse_count,
+            'indices': {'bufferView': 1, 'componentType': 5125},
+            'values': {'bufferView': 2},
+        }
+        data += indices + values
+
+    return (make_glb_op(data, buffer_views, [accessor]), accessor, count * elem_size)
+
+
+def bench_accessors(args):
+    n = args.vertices
+    cases = [
+        ('POSITION VEC3 FLOAT', dict(ty='VEC3', component_type=5126)),
+        ('interleaved VEC3 FLOAT stride 32', dict(ty='VEC3', component_type=5126, stride=32)),
+        ('indices SCALAR UNSIGNED_INT', dict(ty='SCALAR', component_type=5125)),
+        ('indices SCALAR UNSIGNED_SHORT', dict(ty='SCALAR', component_type=5123)),
+        ('TEXCOORD VEC2 UNSIGNED_SHORT normalized', dict(ty='VEC2', component_type=5123, normalized=True)),
+        ('COLOR VEC4 UNSIGNED_BYTE normalized', dict(ty='VEC4', component_type=5121, normalized=True)),
+        ('MAT3 BYTE (padded)', dict(ty='MAT3', component_type=5120)),
+        ('MAT4 FLOAT', dict(ty='MAT4', component_type=5126)),
+        ('sparse VEC3 FLOAT 1%', dict(ty='VEC3', component_type=5126, sparse_count=max(1, n // 100))),
+    ]
+    results = []
+    for name, params in cases:
+        (op, accessor, num_bytes) = accessor_case(n, **params)
+        seconds = measure(lambda: buffer.create_accessor_from_properties(op, accessor), args.repeat)
+        results.append(result('accessor: ' + name, seconds, num_bytes, n))
+    return results
+
+
+def bench_buffers(args, tmp_dir):
+    data = random_bytes(args.vertices * 12)
+    results = []
+
+    gltf = {
+        'asset': {'version': '2.0'},
+        'buffers': [{'byteLength': len(data)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': i * 12, 'byteLength': 12}
+            for i in range(0, args.views)
+        ],
+    }
+    contents = make_glb(gltf, data)
+
+    def parse():
+        make_op(None).parse_glb(contents)
+    seconds = measure(parse, args.repeat)
+    results.append(result('parse_glb', seconds, len(contents), 1))
+
+    bin_path = os.path.join(tmp_dir, 'buffer.bin')
+    with open(bin_path, 'wb') as f:
+        f.write(data)
+    for use_mmap in (False, True):
+        def create():
+            op = make_op({'buffers': [{'uri': 'buffer.bin', 'byteLength': len(data)}]})
+            op.base_path = tmp_dir
+            op.use_mmap = use_mmap
+            view = buffer.create_buffer(op, 0)
+            # Touch every page so mapping isn't free
+            np.frombuffer(view, dtype=np.uint8)[::4096].sum()
+            del view
+            buffer.release_files(op)
+        seconds = measure(create, args.repeat)
+        name = 'create_buffer: file%s' % (' (mmap)' if use_mmap else '')
+        results.append(result(name, seconds, len(data), 1))
+
+    uri = 'data:application/octet-stream;base64,' + base64.b64encode(data).decode('ascii')
+
+    def create_data_uri():
+        op = make_op({'buffers': [{'uri': uri, 'byteLength': len(data)}]})
+        buffer.create_buffer(op, 0)
+    seconds = measure(create_data_uri, args.repeat)
+    results.append(result('create_buffer: data URI', seconds, len(data), 1))
+
+    def create_views():
+        op = make_glb_op(data, gltf['bufferViews'], [])
+        for i in range(0, args.views):
+            buffer.create_buffer_view(op, i)
+    seconds = measure(create_views, args.repeat)
+    results.append(result('create_buffer_view', seconds, 12 * args.views, args.views))
+
+    return results
+
+
+def peak_memory(func):
+    """Return the peak Python heap use while running func."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_data_uris(args):
+    """Compare ways of decoding a big base64 data URI."""
+    data = random_bytes(args.data_uri_size * 1000000)
+    uri = 'data:application/octet-stream;base64,' + base64.b64encode(data).decode('ascii')
+    contents = ('{"buffers":[{"uri":"%s"}]}' % uri).encode('ascii')
+
+    def sliced():
+        # What buffer.create_buffer used to do
+        base64.b64decode(uri[uri.find(';base64,') + 8:])
+
+    def chunked():
+        datauri.decode(uri)
+
+    def lazy():
+        (gltf, _) = datauri.load_json(contents)
+        datauri.decode(gltf['buffers'][0]['uri'])
+
+    results = []
+    for name, func in [
+        ('b64decode of sliced URI', sliced),
+        ('chunked decode', chunked),
+        ('lazy URI, chunked decode', lazy),
+    ]:
+        seconds = measure(func, args.repeat)
+        r = result('data URI: ' + name, seconds, len(data), 1)
+        r['peakMemory'] = peak_memory(func)
+        results.append(r)
+    return results
+
+
+def bench_topology(args):
+    n = args.vertices
+    indices = np.random.RandomState(3).randint(0, n, n).astype(np.uint32)
+    results = []
+    for name in ['lines', 'line_strip', 'line_loop', 'triangles', 'triangle_strip', 'triangle_fan']:
+        func = getattr(topology, name)
+        seconds = measure(lambda: func(indices), args.repeat)
+        results.append(result('topology: ' + name, seconds, indices.nbytes, n))
+    return results
+
+
+def decode_scene(op):
+    """Do the Blender-independent part of an import: decode every mesh
+    primitive (with its topology) and animation sampler.
+    """
+    for m in op.gltf.get('meshes', []):
+        for primitive in m['primitives']:
+            mesh.decode_primitive(op, primitive)
+    for anim in op.gltf.get('animations', []):
+        for sampler in anim['samplers']:
+            animation.decode_sampler(op, sampler, 24)
+
+
+def bench_scaling(args, tmp_dir):
+    results = []
+    for (num_nodes, num_verts) in SCALING_STEPS[:args.scaling_steps]:
+        path = os.path.join(tmp_dir, 'scene.glb')
+        meshes = 10
+        stats = gltf_generator.generate(
+            path,
+            nodes=num_nodes,
+            depth=8,
+            meshes=meshes,
+            vertices=num_verts // meshes,
+            textures=4,
+            texture_size=256,
+            skins=1,
+            animation_length=100,
+        )
+
+        tracemalloc.start()
+        start = timer()
+        op = load_op(path, use_mmap=True)
+        decode_scene(op)
+        seconds = timer() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del op
+        os.remove(path)
+
+        results.append({
+            'nodes': stats['nodes'],
+            'vertices': stats['vertices'],
+            'fileSize': stats['bufferLength'],
+            'timeElapsed': seconds,
+            'peakMemory': peak,
+        })
+    return results
+
+
+def print_scaling(results):
+    print('%12s %12s %12s %12s %14s' % ('nodes', 'vertices', 'file (MB)', 'time (s)', 'peak mem (MB)'))
+    for r in results:
+        print('%12d %12d %12.1f %12.3f %14.1f' % (
+            r['nodes'], r['vertices'], r['fileSize'] / 1e6, r['timeElapsed'], r['peakMemory'] / 1e6
+        ))
+
+
+def bench_nodes(args, tmp_dir):
+    """Walk generated node forests and compute their world matrices."""
+    results = []
+    cases = [
+        ('deep tree (one chain)', args.nodes),
+        ('tree of depth 16', 16),
+    ]
+    for name, depth in cases:
+        path = os.path.join(tmp_dir, 'nodes.gltf')
+        gltf_generator.generate(path, nodes=args.nodes, depth=depth, meshes=0)
+        op = load_op(path)
+        nodes = op.gltf['nodes']
+        roots = op.gltf['scenes'][0]['nodes']
+
+        def walk():
+            (idxs, parents, _) = node.traverse(nodes, roots)
+            node.world_matrices(nodes, idxs, parents)
+        seconds = measure(walk, args.repeat)
+        results.append(result('nodes: ' + name, seconds, 0, args.nodes))
+    return results
+
+
+def run_benchmarks(args):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        return (
+            bench_accessors(args) +
+            bench_buffers(args, tmp_dir) +
+            bench_topology(args) +
+            bench_nodes(args, tmp_dir) +
+            bench_data_uris(args)
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def print_results(results):
+    print('%-48s %12s %12s %16s %14s' % ('benchmark', 'time (s)', 'MB/s', 'elements/s', 'peak mem (MB)'))
+    for r in results:
+        peak = '%14.1f' % (r['peakMemory'] / 1e6) if 'peakMemory' in r else ''
+        print('%-48s %12.5f %12.1f %16.0f %s' % (
+            r['name'], r['timeElapsed'], r['mbPerSecond'], r['elementsPerSecond'], peak
+        ))
+
+
+def compare(results, baseline, threshold):
+    """Compare results with a baseline; returns the names of regressions."""
+    old = {r['name']: r for r in baseline['results']}
+    regressions = []
+    print('\nchange in throughput vs. baseline:')
+    for r in results:
+        if r['name'] not in old:
+            continue
+        change = r['elementsPerSecond'] / old[r['name']]['elementsPerSecond'] - 1
+        regressed = change < -threshold
+        mark = '\033[31m' + 'REGRESSION' + '\033[0m' if regressed else ''
+        print('%-48s %+8.1f%% %s' % (r['name'], 100 * change, mark))
+        if regressed:
+            regressions.append(r['name'])
+    return regressions
+
+
+parser = argparse.ArgumentParser(description='Benchmark the glTF importer without Blender.')
+parser.add_argument('--vertices', type=int, default=200000, help='elements per accessor')
+parser.add_argument('--views', type=int, default=10000, help='number of buffer views')
+parser.add_argument('--nodes', type=int, default=100000, help='number of nodes in node benchmarks')
+parser.add_argument(
+    '--data-uri-size', type=int, default=128,
+    help='size (in MB) of the data decoded by the data URI benchmarks',
+)
+parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark (the best one counts)')
+parser.add_argument('--baseline', default=baseline_path, help='baseline file to compare with')
+parser.add_argument('--save-baseline', action='store_true', help='save the results as the baseline')
+parser.add_argument(
+    '--threshold', type=float, default=25,
+    help='slowdown (in percent) that counts as a regression',
+)
+parser.add_argument('--output', help='also write the results to this JSON file')
+parser.add_argument(
+    '--scaling', action='store_true',
+    help='measure how loading generated scenes scales with their size instead',
+)
+parser.add_argument(
+    '--scaling-steps', type=int, default=3,
+    help='how many of the scaling scenes to run (up to %d)' % len(SCALING_STEPS),
+)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    if args.scaling:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            results = bench_scaling(args, tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir)
+        print_scaling(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'scaling': results}, f, indent=4)
+        sys.exit(0)
+
+    results = run_benchmarks(args)
+    print_results(results)
+
+    report = {
+        'config': {
+            'vertices': args.vertices,
+            'views': args.views,
+            'nodes': args.nodes,
+            'dataUriSize': args.data_uri_size,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print('\nsaved baseline to', args.baseline)
+        sys.exit(0)
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != report['config']:
+            print('\nbaseline was made with a different config; not comparing')
+            sys.exit(0)
+        regressions = compare(results, baseline, args.threshold / 100)
+        sys.exit(3 if regressions else 0)
@@ -7,11 +7,20 @@ file report.json in the same directory as this script.
 This script is designed to be run inside Blender by run_tests.py.
 You probably don't want to try running it on its own.
 
+run_tests.py can split the files between several Blender processes. It
+then passes each one the list of files to import and where to write its
+report as arguments after a '--', eg.
+
+    blender ... --python generate_report.py -- --files list.txt --report part.json --repeat 3
+
 """
 
+import argparse
 import glob
 import json
 import os
+import statistics
+import sys
 from timeit import default_timer as timer
 
 import bpy
@@ -22,29 +31,80 @@ samples_path = os.path.join(base_dir, 'glTF-Sample-Models', '2.0')
 report_path = os.path.join(base_dir, 'report.json')
 
 
-def run_tests():
+def find_files(path):
+    return (
+        glob.glob(path + '/**/*.gltf', recursive=True) +
+        glob.glob(path + '/**/*.glb', recursive=True)
+    )
+
+
+def reset_peak_memory():
+    """Reset the peak RSS of this process (only possible on Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def get_peak_memory():
+    """Get the peak RSS of this process in bytes.
+
+    On Linux this is the peak since the last reset_peak_memory;
+    elsewhere it's the peak over the whole life of the process. Returns
+    None where it isn't known (Windows).
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Not on Windows
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def run_tests(files, repeat=1):
+    """Import each file repeat times.
+
+    The timeElapsed of a test is the median of its runs; all the times
+    are kept in its 'times' list.
+    """
     report = {'tests': []}
     tests = report['tests']
 
-    files = (
-        glob.glob(samples_path + '/**/*.gltf', recursive=True) +
-        glob.glob(samples_path + '/**/*.glb', recursive=True)
-    )
     for filename in files:
         print('\nTrying ', filename, '...')
 
-        bpy.ops.wm.read_factory_settings()
         try:
-            start_time = timer()
-            bpy.ops.import_scene.gltf(filepath=filename)
-            end_time = timer()
+            times = []
+            peak_memory = None
+            for _ in range(0, repeat):
+                bpy.ops.wm.read_factory_settings()
+                reset_peak_memory()
+                start_time = timer()
+                bpy.ops.import_scene.gltf(filepath=filename)
+                end_time = timer()
+                times.append(end_time - start_time)
+                peak = get_peak_memory()
+                if peak is not None:
+                    peak_memory = max(peak_memory or 0, peak)
             print('[PASSED]\n')
 
             test = {
                 'filename': filename,
                 'result': 'PASSED',
-                'timeElapsed': end_time - start_time,
+                'timeElapsed': statistics.median(times),
+                'times': times,
             }
+            if peak_memory is not None:
+                test['peakMemory'] = peak_memory
 
         except Exception as e:
             print('[FAILED]\n')
@@ -59,6 +119,20 @@ def run_tests():
     return report
 
 
-report = run_tests()
-with open(report_path, 'w+') as report_file:
+parser = argparse.ArgumentParser()
+parser.add_argument('--files', help='file listing the glTF files to import, one per line')
+parser.add_argument('--report', default=report_path, help='where to write the report')
+parser.add_argument('--repeat', type=int, default=1, help='how many times to import each file')
+# Blender leaves its own arguments in sys.argv; ours come after '--'
+argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+args = parser.parse_args(argv)
+
+if args.files:
+    with open(args.files) as f:
+        files = [line.rstrip('\n') for line in f if line.strip()]
+else:
+    files = find_files(samples_path)
+
+report = run_tests(files, args.repeat)
+with open(args.report, 'w+') as report_file:
     json.dump(report, report_file, indent=4)
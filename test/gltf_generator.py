@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+"""Generate synthetic glTF scenes for scaling tests.
+
+The scenes are valid glTF 2.0 (.gltf with an external .bin, or .glb)
+and are completely determined by their parameters and the seed, so the
+same command always writes the same file. Among the things that can be
+controlled are the number of nodes and the depth of the hierarchy, the
+number of meshes, primitives and vertices, textures and their size,
+skins, and the length of the animation.
+
+The binary data is written out piece by piece as it is generated, so
+scenes much larger than memory can be made.
+
+Use it from the command line, eg.
+
+    python gltf_generator.py big.glb --nodes 100000 --vertices 1000000
+
+or import it and call generate().
+"""
+
+import argparse
+import json
+import math
+import os
+import struct
+import zlib
+
+import numpy as np
+
+
+DEFAULTS = {
+    'seed': 0,
+    'nodes': 100,
+    'depth': 4,
+    'meshes': 10,
+    'primitives': 1,
+    'vertices': 1000,
+    'textures': 0,
+    'texture_size': 64,
+    'skins': 0,
+    'joints': 8,
+    'animation_length': 0,
+    'animated_nodes': 10,
+}
+
+
+def make_png(size, seed):
+    """Make an RGB PNG of the given size with a (cheap to compress) pattern."""
+    rng = np.random.RandomState(seed)
+    color = rng.randint(0, 256, 3)
+    x = np.arange(0, size, dtype=np.uint32)
+    gradient = (x[:, np.newaxis] + x[np.newaxis, :]) * 255 // max(1, 2 * size - 2)
+    pixels = np.empty((size, size, 3), dtype=np.uint8)
+    pixels[:, :, 0] = gradient
+    pixels[:, :, 1] = color[1]
+    pixels[:, :, 2] = (color[2] + gradient) % 256
+    # Each row starts with filter type 0 (None)
+    rows = np.concatenate((np.zeros((size, 1), dtype=np.uint8), pixels.reshape(size, -1)), axis=1)
+
+    def chunk(tag, data):
+        crc = zlib.crc32(tag + data) & 0xffffffff
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', crc)
+
+    return (
+        b'\x89PNG\r\n\x1a\n' +
+        chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)) +
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 1)) +
+        chunk(b'IEND', b'')
+    )
+
+
+class BufferBuilder:
+    """Lays out buffer views in a single buffer.
+
+    Views are added with their length and a function that makes their
+    data; the data is only generated when the buffer is written.
+    """
+
+    def __init__(self):
+        self.views = []
+        self.parts = []
+        self.length = 0
+
+    def add_view(self, byte_length, make_data, target=None):
+        view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': byte_length}
+        if target:
+            view['target'] = target
+        self.views.append(view)
+        self.parts.append((byte_length, make_data))
+        # Keep every view 4-byte aligned
+        self.length += byte_length + (-byte_length % 4)
+        return len(self.views) - 1
+
+    def write(self, f):
+        for (byte_length, make_data) in self.parts:
+            data = make_data()
+            assert len(data) == byte_length
+            f.write(data)
+            f.write(b'\0' * (-byte_length % 4))
+
+
+class SceneBuilder:
+    def __init__(self, params):
+        self.params = params
+        self.buffer = BufferBuilder()
+        self.accessors = []
+
+    def add_accessor(self, count, ty, component_type, make_array, target=None, **extra):
+        """Add an accessor whose data is make_array() (a numpy array)."""
+        sizes = {5121: 1, 5123: 2, 5125: 4, 5126: 4}
+        components = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+        byte_length = count * components[ty] * sizes[component_type]
+        view = self.buffer.add_view(byte_length, lambda: make_array().tobytes(), target)
+        accessor = {'bufferView': view, 'componentType': component_type, 'count': count, 'type': ty}
+        accessor.update(extra)
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def rng(self, *key):
+        """A random generator that only depends on the seed and key."""
+        return np.random.RandomState([self.params['seed']] + list(key))
+
+    def build_primitive(self, mesh_idx, prim_idx, skinned, material):
+        p = self.params
+        n = p['vertices']
+        key = (mesh_idx, prim_idx)
+
+        def positions():
+            return self.rng(1, *key).uniform(-1, 1, (n, 3)).astype('<f4')
+
+        def normals():
+            v = self.rng(2, *key).normal(size=(n, 3))
+            return (v / np.linalg.norm(v, axis=1)[:, np.newaxis]).astype('<f4')
+
+        def texcoords():
+            return self.rng(3, *key).uniform(0, 1, (n, 2)).astype('<f4')
+
+        index_type = 5123 if n <= 65536 else 5125
+        num_indices = 3 * n
+
+        def indices():
+            dtype = '<u2' if index_type == 5123 else '<u4'
+            return self.rng(4, *key).randint(0, n, num_indices).astype(dtype)
+
+        attributes = {
+            'POSITION': self.add_accessor(
+                n, 'VEC3', 5126, positions, target=34962,
+                min=[-1, -1, -1], max=[1, 1, 1],
+            ),
+            'NORMAL': self.add_accessor(n, 'VEC3', 5126, normals, target=34962),
+            'TEXCOORD_0': self.add_accessor(n, 'VEC2', 5126, texcoords, target=34962),
+        }
+
+        if skinned:
+            num_joints = p['joints']
+
+            def joints():
+                return self.rng(5, *key).randint(0, num_joints, (n, 4)).astype('<u2')
+
+            def weights():
+                w = self.rng(6, *key).uniform(0, 1, (n, 4))
+                return (w / w.sum(axis=1)[:, np.newaxis]).astype('<f4')
+
+            attributes['JOINTS_0'] = self.add_accessor(n, 'VEC4', 5123, joints, target=34962)
+            attributes['WEIGHTS_0'] = self.add_accessor(n, 'VEC4', 5126, weights, target=34962)
+
+        primitive = {
+            'attributes': attributes,
+            'indices': self.add_accessor(num_indices, 'SCALAR', index_type, indices, target=34963),
+        }
+        if material is not None:
+            primitive['material'] = material
+        return primitive
+
+    def build_nodes(self):
+        """Make the node hierarchy.
+
+        The nodes are split into `depth` levels of equal size; every node
+        below the first level gets a random parent from the level above.
+        """
+        p = self.params
+        num_nodes = p['nodes']
+        depth = max(1, min(p['depth'], num_nodes))
+        width = int(math.ceil(num_nodes / depth))
+        rng = self.rng(7)
+
+        nodes = [{'name': 'node%d' % i} for i in range(0, num_nodes)]
+        children = [[] for _ in range(0, num_nodes)]
+        for i in range(width, num_nodes):
+            level_start = (i // width - 1) * width
+            parent = level_start + rng.randint(0, width)
+            children[parent].append(i)
+        for i, node in enumerate(nodes):
+            if children[i]:
+                node['children'] = children[i]
+            node['translation'] = [float(x) for x in rng.uniform(-1, 1, 3)]
+
+        roots = list(range(0, min(width, num_nodes)))
+        return (nodes, roots)
+
+    def build(self):
+        p = self.params
+        gltf = {
+            'asset': {'version': '2.0', 'generator': 'gltf_generator.py'},
+            'scene': 0,
+        }
+
+        (nodes, roots) = self.build_nodes()
+        gltf['nodes'] = nodes
+        gltf['scenes'] = [{'nodes': roots}]
+
+        # Textures and materials
+        if p['textures']:
+            images = []
+            for i in range(0, p['textures']):
+                png_length = len(make_png(p['texture_size'], i))
+                view = self.buffer.add_view(
+                    png_length,
+                    lambda i=i: make_png(p['texture_size'], i),
+                )
+                images.append({'bufferView': view, 'mimeType': 'image/png'})
+            gltf['images'] = images
+            gltf['samplers'] = [{}]
+            gltf['textures'] = [{'source': i, 'sampler': 0} for i in range(0, p['textures'])]
+            gltf['materials'] = [
+                {'pbrMetallicRoughness': {'baseColorTexture': {'index': i}}}
+                for i in range(0, p['textures'])
+            ]
+
+        # Skins use the first nodes as joints
+        num_skins = p['skins'] if p['nodes'] else 0
+        if num_skins:
+            joints = list(range(0, min(p['joints'], p['nodes'])))
+            gltf['skins'] = [{'joints': joints} for _ in range(0, num_skins)]
+
+        # Meshes
+        meshes = []
+        for mesh_idx in range(0, p['meshes']):
+            skinned = num_skins > 0
+            primitives = []
+            for prim_idx in range(0, p['primitives']):
+                material = None
+                if p['textures']:
+                    material = (mesh_idx * p['primitives'] + prim_idx) % p['textures']
+                primitives.append(self.build_primitive(mesh_idx, prim_idx, skinned, material))
+            meshes.append({'name': 'mesh%d' % mesh_idx, 'primitives': primitives})
+        if meshes:
+            gltf['meshes'] = meshes
+            # Skip the joints so skinned meshes aren't parented to their own skeleton
+            first = len(gltf['skins'][0]['joints']) if num_skins else 0
+            for i in range(first, len(nodes)):
+                mesh_idx = i % len(meshes)
+                nodes[i]['mesh'] = mesh_idx
+                if num_skins:
+                    nodes[i]['skin'] = mesh_idx % num_skins
+
+        # Animation
+        if p['animation_length'] and nodes:
+            length = p['animation_length']
+            animated = min(p['animated_nodes'], len(nodes))
+            times = self.add_accessor(
+                length, 'SCALAR', 5126,
+                lambda: (np.arange(0, length) / 24).astype('<f4'),
+                min=[0], max=[(length - 1) / 24],
+            )
+            samplers = []
+            channels = []
+            for i in range(0, animated):
+                def translations(i=i):
+                    return self.rng(8, i).uniform(-1, 1, (length, 3)).astype('<f4')
+
+                def rotations(i=i):
+                    q = self.rng(9, i).normal(size=(length, 4))
+                    return (q / np.linalg.norm(q, axis=1)[:, np.newaxis]).astype('<f4')
+
+                for path, ty, make in [('translation', 'VEC3', translations), ('rotation', 'VEC4', rotations)]:
+                    output = self.add_accessor(length, ty, 5126, make)
+                    samplers.append({'input': times, 'output': output})
+                    channels.append({
+                        'sampler': len(samplers) - 1,
+                        'target': {'node': i, 'path': path},
+                    })
+            gltf['animations'] = [{'name': 'animation', 'samplers': samplers, 'channels': channels}]
+
+        if self.accessors:
+            gltf['accessors'] = self.accessors
+        if self.buffer.views:
+            gltf['bufferViews'] = self.buffer.views
+        return gltf
+
+
+def generate(path, **params):
+    """Write a synthetic scene to path (.gltf or .glb).
+
+    Takes the parameters in DEFAULTS as keyword arguments. Returns some
+    statistics about the generated scene.
+    """
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise TypeError('unknown parameters: %s' % ', '.join(sorted(unknown)))
+    full_params = dict(DEFAULTS)
+    full_params.update(params)
+
+    builder = SceneBuilder(full_params)
+    gltf = builder.build()
+    buffer_length = builder.buffer.length
+    is_glb = path.endswith('.glb')
+
+    if buffer_length:
+        gltf['buffers'] = [{'byteLength': buffer_length}]
+        if not is_glb:
+            bin_name = os.path.splitext(os.path.basename(path))[0] + '.bin'
+            gltf['buffers'][0]['uri'] = bin_name
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+
+    if is_glb:
+        json_chunk += b' ' * (-len(json_chunk) % 4)
+        length = 12 + 8 + len(json_chunk)
+        if buffer_length:
+            length += 8 + buffer_length
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<4sII', b'glTF', 2, length))
+            f.write(struct.pack('<I4s', len(json_chunk), b'JSON'))
+            f.write(json_chunk)
+            if buffer_length:
+                f.write(struct.pack('<I4s', buffer_length, b'BIN\0'))
+                builder.buffer.write(f)
+    else:
+        with open(path, 'wb') as f:
+            f.write(json_chunk)
+        if buffer_length:
+            with open(os.path.join(os.path.dirname(path), bin_name), 'wb') as f:
+                builder.buffer.write(f)
+
+    return {
+        'nodes': len(gltf.get('nodes', [])),
+        'meshes': len(gltf.get('meshes', [])),
+        'accessors': len(gltf.get('accessors', [])),
+        'vertices': full_params['meshes'] * full_params['primitives'] * full_params['vertices'],
+        'bufferLength': buffer_length,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic glTF scene.')
+    parser.add_argument('path', help='output file (.gltf or .glb)')
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=int, default=default)
+    args = vars(parser.parse_args())
+    path = args.pop('path')
+    print(generate(path, **args))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,19 +8,35 @@ values are:
 0 - All tests passed
 1 - Some kind of error occurred (as distinct from "some test failed")
 3 - At least one test failed
+4 - All tests passed, but importing got slower than the baseline allows
+    (only when comparing with --compare)
+
+Old reports are kept in the report-history directory so later runs can
+be compared with them. Import times are noisy; use --repeat to import
+each file several times and compare medians. A file only counts as a
+regression when it got slower by more than --threshold percent and by
+more than the noise (the median absolute deviation) of its runs.
 
 """
 
 import argparse
+import glob
 import json
 import os
+import shutil
 import subprocess
+import statistics
 import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 samples_path = os.path.join(base_dir, 'glTF-Sample-Models', '2.0')
 report_path = os.path.join(base_dir, 'report.json')
+history_dir = os.path.join(base_dir, 'report-history')
+baseline_path = os.path.join(history_dir, 'baseline.json')
 test_script = os.path.join(base_dir, 'generate_report.py')
 scripts_dir = os.path.join(base_dir, os.pardir)
 
@@ -59,10 +75,103 @@ def fetch_samples():
         print('This step should only happen once.\n\n')
 
 
-def generate_report():
+def find_files(path):
+    return (
+        glob.glob(path + '/**/*.gltf', recursive=True) +
+        glob.glob(path + '/**/*.glb', recursive=True)
+    )
+
+
+def split_files(files, num_chunks):
+    """Split files into chunks of roughly equal total size.
+
+    Files are handed out biggest first, each to the chunk that's
+    smallest so far, so the workers should all finish around the same
+    time.
+    """
+    chunks = [[] for _ in range(0, num_chunks)]
+    sizes = [0] * num_chunks
+    for filename in sorted(files, key=os.path.getsize, reverse=True):
+        i = sizes.index(min(sizes))
+        chunks[i].append(filename)
+        sizes[i] += os.path.getsize(filename)
+    return [chunk for chunk in chunks if chunk]
+
+
+def run_worker(files, tmp_dir, num, env, repeat):
+    """Import files in one Blender process.
+
+    Returns its list of test results. Files it didn't get to (eg.
+    because Blender crashed) are reported as failed.
+    """
+    files_path = os.path.join(tmp_dir, 'files%d.txt' % num)
+    part_path = os.path.join(tmp_dir, 'report%d.json' % num)
+    with open(files_path, 'w') as f:
+        f.write(''.join(filename + '\n' for filename in files))
+
+    proc = subprocess.Popen(
+        [
+            'blender',
+            '-noaudio',  # sound ssystem to None (less output on stdout)
+            '--background',  # run UI-less
+            '--factory-startup',  # factory settings
+            '--addons', 'io_scene_gltf',  # enable the addon
+            '--python', test_script,  # run the test script
+            '--',
+            '--files', files_path,
+            '--report', part_path,
+            '--repeat', str(repeat),
+        ],
+        env=env,
+    )
+    peak = None
+    if hasattr(os, 'wait4'):
+        # Use wait4 to also get the peak memory use of the whole worker
+        (_, status, rusage) = os.wait4(proc.pid, 0)
+        proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+        # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+        peak = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    else:
+        # Windows
+        proc.wait()
+
+    tests = []
+    if os.path.exists(part_path):
+        with open(part_path) as f:
+            tests = json.load(f)['tests']
+    done = set(test['filename'] for test in tests)
+    for filename in files:
+        if filename not in done:
+            tests.append({
+                'filename': filename,
+                'result': 'FAILED',
+                'error': 'Blender exited with code %d before importing this file' % proc.returncode,
+            })
+
+    if peak is None:
+        print('worker %d finished %d files' % (num, len(files)))
+    else:
+        print('worker %d finished %d files (peak memory %.1f MB)' % (num, len(files), peak / 1e6))
+    return tests
+
+
+def archive_report():
+    """Move the last report.json into the history directory."""
+    if not os.path.exists(report_path):
+        return
+    os.makedirs(history_dir, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(os.path.getmtime(report_path)))
+    shutil.move(report_path, os.path.join(history_dir, 'report-%s.json' % stamp))
+
+
+def generate_report(samples_dir=samples_path, jobs=None, repeat=1):
     """Calls Blender to generate report.json file.
+
+    The files are split between jobs Blender processes running side by
+    side (one per CPU by default) and their results merged. Each file is
+    imported repeat times.
     """
-    if not os.path.isdir(samples_path):
+    if samples_dir == samples_path and not os.path.isdir(samples_path):
         print("Couldn't find glTF-Sample-Models/2.0/")
         print("I'll try to fetch it for you...")
         fetch_samples()
@@ -84,24 +193,40 @@ def generate_report():
     env['BLENDER_USER_SCRIPTS'] = scripts_dir
     # TODO: Should we worry about BLENDER_SYSTEM_SCRIPTS, etc?
 
-    subprocess.run(
-        [
-            'blender',
-            '-noaudio',  # sound ssystem to None (less output on stdout)
-            '--background',  # run UI-less
-            '--factory-startup',  # factory settings
-            '--addons', 'io_scene_gltf',  # enable the addon
-            '--python', test_script  # run the test script
-        ],
-        env=env,
-        check=True
-    )
+    files = sorted(find_files(samples_dir))
+    chunks = split_files(files, jobs or os.cpu_count() or 1)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        with ThreadPoolExecutor(max_workers=len(chunks) or 1) as executor:
+            futures = [
+                executor.submit(run_worker, chunk, tmp_dir, num, env, repeat)
+                for num, chunk in enumerate(chunks)
+            ]
+            results = [test for future in futures for test in future.result()]
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    # Keep the report in the same order however the files were split
+    order = {filename: i for i, filename in enumerate(files)}
+    results.sort(key=lambda test: order[test['filename']])
+
+    archive_report()
+    with open(report_path, 'w') as f:
+        json.dump({'tests': results}, f, indent=4)
+
+
+def test_name(filename):
+    """Name to show for a test: its path relative to the sample models."""
+    if filename.startswith(samples_path):
+        return os.path.relpath(filename, samples_path)
+    return filename
 
 
 def print_report():
     """Print report from report.json file.
 
-    Exits with the appropriate exit code afterwards.
+    Returns the appropriate exit code.
 
     """
     with open(report_path) as f:
@@ -116,10 +241,13 @@ def print_report():
     failed = '\033[31m' + 'FAILED' + '\033[0m'  # red 'FAILED'
 
     for test in tests:
-        name = os.path.relpath(test['filename'], samples_path)
+        name = test_name(test['filename'])
         print('import', name, '... ', end='')
         if test['result'] == 'PASSED':
-            print(ok, "(%.4f s)" % test['timeElapsed'])
+            if 'peakMemory' in test:
+                print(ok, "(%.4f s, %.1f MB)" % (test['timeElapsed'], test['peakMemory'] / 1e6))
+            else:
+                print(ok, "(%.4f s)" % test['timeElapsed'])
             num_passed += 1
         else:
             print(failed)
@@ -138,8 +266,7 @@ def print_report():
         (result, num_passed, num_failed)
     )
 
-    exit_code = 0 if num_failed == 0 else 3
-    sys.exit(exit_code)
+    return 0 if num_failed == 0 else 3
 
 
 def print_times():
@@ -152,10 +279,95 @@ def print_times():
     tests.sort(key=lambda test: test['timeElapsed'], reverse=True)
 
     for (num, test) in enumerate(tests, start=1):
-        name = os.path.relpath(test['filename'], samples_path)
+        name = test_name(test['filename'])
         print('( #%-3d )  % 2.4fs   %s' % (num, test['timeElapsed'], name))
 
 
+def find_baseline(path):
+    """Find the report to compare with.
+
+    With no path, that's the saved baseline if there is one, otherwise
+    the most recent report in the history.
+    """
+    if path:
+        return path
+    if os.path.exists(baseline_path):
+        return baseline_path
+    history = sorted(
+        name for name in os.listdir(history_dir) if name.startswith('report-')
+    ) if os.path.isdir(history_dir) else []
+    if not history:
+        return None
+    return os.path.join(history_dir, history[-1])
+
+
+def timing_stats(test):
+    """Return (median, noise) of a passed test's import times.
+
+    The noise is the median absolute deviation of the times, scaled to be
+    comparable to a standard deviation. It's 0 for a single run.
+    """
+    times = test.get('times', [test['timeElapsed']])
+    median = statistics.median(times)
+    mad = statistics.median(abs(t - median) for t in times)
+    return (median, 1.4826 * mad)
+
+
+def compare_reports(baseline_file, threshold):
+    """Compare the import times in report.json with those in a baseline.
+
+    Prints the change for each file and for the total time. Returns True
+    if anything regressed.
+    """
+    with open(report_path) as f:
+        report = json.load(f)
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+
+    def passed(report):
+        return {
+            test_name(test['filename']): test
+            for test in report['tests']
+            if test['result'] == 'PASSED'
+        }
+    new = passed(report)
+    old = passed(baseline)
+    names = sorted(set(new) & set(old))
+
+    print('comparing with', baseline_file)
+    regressed = '\033[31m' + 'REGRESSION' + '\033[0m'
+    regressions = []
+    (old_total, new_total) = (0, 0)
+    for name in names:
+        (old_time, old_noise) = timing_stats(old[name])
+        (new_time, new_noise) = timing_stats(new[name])
+        old_total += old_time
+        new_total += new_time
+        change = (new_time - old_time) / old_time if old_time else 0
+        is_regression = (
+            change > threshold and
+            new_time - old_time > 3 * max(old_noise, new_noise)
+        )
+        print('% 2.4fs -> % 2.4fs  %+7.1f%%   %s %s' % (
+            old_time, new_time, 100 * change, name, regressed if is_regression else '',
+        ))
+        if is_regression:
+            regressions.append(name)
+
+    total_change = (new_total - old_total) / old_total if old_total else 0
+    total_regressed = total_change > threshold
+    print('\ntotal: % 2.4fs -> % 2.4fs  %+.1f%% %s' % (
+        old_total, new_total, 100 * total_change, regressed if total_regressed else '',
+    ))
+    if regressions:
+        print('\nregressions:')
+        for name in regressions:
+            print('   ', name)
+    print()
+
+    return bool(regressions) or total_regressed
+
+
 parser = argparse.ArgumentParser(description='Run glTF importer tests.')
 parser.add_argument(
     '--print-last-report',
@@ -167,12 +379,62 @@ parser.add_argument(
     action='store_true',
     help="show last results sorted by import time (don't run tests again)",
 )
+parser.add_argument(
+    '--jobs', '-j',
+    type=int,
+    default=os.cpu_count(),
+    help='number of Blender processes to run at once (default: number of CPUs)',
+)
+parser.add_argument(
+    '--samples-dir',
+    default=samples_path,
+    help='directory to search for .gltf/.glb files (default: the glTF sample models)',
+)
+parser.add_argument(
+    '--repeat',
+    type=int,
+    default=1,
+    help='import each file this many times and use the median time',
+)
+parser.add_argument(
+    '--compare',
+    nargs='?',
+    const='',
+    metavar='REPORT',
+    help='compare import times with REPORT (default: the saved baseline, '
+         'or else the previous report)',
+)
+parser.add_argument(
+    '--threshold',
+    type=float,
+    default=10,
+    help='slowdown (in percent) that counts as a regression (default: 10)',
+)
+parser.add_argument(
+    '--save-baseline',
+    action='store_true',
+    help='save the report as the baseline for --compare',
+)
 args = parser.parse_args()
 
 if args.print_last_times:
     print_times()
-elif args.print_last_report:
-    print_report()
-else:
-    generate_report()
-    print_report()
+    sys.exit(0)
+
+if not args.print_last_report:
+    generate_report(args.samples_dir, args.jobs, args.repeat)
+exit_code = print_report()
+
+if args.compare is not None:
+    baseline_file = find_baseline(args.compare)
+    if baseline_file is None:
+        print('nothing to compare with yet')
+    elif compare_reports(baseline_file, args.threshold / 100) and exit_code == 0:
+        exit_code = 4
+
+if args.save_baseline:
+    os.makedirs(history_dir, exist_ok=True)
+    shutil.copy(report_path, baseline_path)
+    print('saved baseline to', baseline_path)
+
+sys.exit(exit_code)
@@ -0,0 +1,73 @@
+"""Stand-ins for Blender's Python modules.
+
+The decoding parts of the importer (buffers, accessors, topology, ...)
+don't touch Blender data, but importing io_scene_gltf still pulls in
+bpy and friends. Call install() before importing io_scene_gltf to be
+able to use those parts from a plain Python interpreter.
+
+Inside Blender this does nothing except making the addon importable.
+"""
+
+import os
+import sys
+import types
+
+
+base_dir = os.path.dirname(os.path.abspath(__file__))
+addons_dir = os.path.join(base_dir, os.pardir, os.pardir, 'addons')
+
+
+class Anything:
+    """Accepts any call and attribute access."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Anything()
+
+    def __getattr__(self, name):
+        return Anything()
+
+    def __iter__(self):
+        return iter([])
+
+
+def make_module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    module.__getattr__ = lambda attr: Anything()
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    if addons_dir not in sys.path:
+        sys.path.insert(0, addons_dir)
+
+    try:
+        import bpy as real_bpy  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class Operator:
+        pass
+
+    class ImportHelper:
+        pass
+
+    bpy = make_module('bpy')
+    bpy.types = make_module('bpy.types', Operator=Operator)
+    bpy.props = make_module('bpy.props')
+    bpy.utils = make_module('bpy.utils')
+    bpy.data = Anything()
+    bpy.context = Anything()
+    bpy.ops = Anything()
+
+    bpy_extras = make_module('bpy_extras')
+    bpy_extras.io_utils = make_module('bpy_extras.io_utils', ImportHelper=ImportHelper)
+    bpy_extras.image_utils = make_module('bpy_extras.image_utils')
+
+    make_module('bmesh')
+    make_module('mathutils')
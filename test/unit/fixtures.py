@@ -0,0 +1,76 @@
+"""Helpers for building importer state without going through Blender."""
+
+import json
+import struct
+
+import blender_stub
+blender_stub.install()
+
+from io_scene_gltf import ImportGLTF, datauri, liveness, profiling  # noqa: E402
+
+
+def make_op(gltf, glb_buffer=None):
+    """Make an ImportGLTF with the state execute would set up."""
+    op = ImportGLTF()
+    op.gltf = gltf
+    op.glb_buffer = glb_buffer
+    op.base_path = ''
+    op.use_mmap = False
+    op.mapped_files = []
+    op.lazy_data_uris = []
+    op.decoded_data_uris = datauri.DataURICache()
+    op.accessor_cache_dir = ''
+    op.accessor_cache_size = 1024
+    op.accessor_cache = None
+    op.profiler = profiling.Profiler()
+    op.buffers = {}
+    op.buffer_views = {}
+    op.accessors = {}
+    op.images = {}
+    op.images_by_source = {}
+    op.image_cache_stats = {'hits': 0, 'misses': 0}
+    op.image_prefetch = {}
+    op.image_prefetch_slots = None
+    op.mesh_instance_of = []
+    op.uses = liveness.Uses()
+    op.scene_idx = None
+    op.reachable = None
+    op.mesh_skin_weights = {}
+    op.mesh_morph_targets = {}
+    return op
+
+
+def make_glb_op(data, buffer_views, accessors, **gltf):
+    """Make an op for a GLB whose binary buffer is data.
+
+    Any other top-level glTF properties (meshes, images, ...) can be
+    passed as keyword arguments.
+    """
+    gltf.update({
+        'buffers': [{'byteLength': len(data)}],
+        'bufferViews': buffer_views,
+        'accessors': accessors,
+    })
+    return make_op(gltf, glb_buffer=memoryview(data))
+
+
+def load_op(path, use_mmap=False):
+    """Make an ImportGLTF and load the glTF file at path into it."""
+    op = make_op(None)
+    op.filepath = path
+    op.use_mmap = use_mmap
+    op.load()
+    return op
+
+
+def make_glb(gltf, bin_chunk):
+    """Pack a glTF document and its binary buffer into a GLB file."""
+    json_chunk = json.dumps(gltf).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_chunk += b'\0' * (-len(bin_chunk) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+    return (
+        struct.pack('<4sII', b'glTF', 2, length) +
+        struct.pack('<I4s', len(json_chunk), b'JSON') + json_chunk +
+        struct.pack('<I4s', len(bin_chunk), b'BIN\0') + bin_chunk
+    )
@@ -0,0 +1,112 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import load_op, make_glb  # noqa: E402
+from io_scene_gltf import accessor_cache, buffer  # noqa: E402
+
+
+class AccessorCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.path = os.path.join(self.tmp_dir, 'scene.glb')
+        self.write_glb(1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_glb(self, x):
+        data = struct.pack('<6f', x, 2, 3, 4, 5, 6)
+        gltf = {
+            'asset': {'version': '2.0'},
+            'buffers': [{'byteLength': len(data)}],
+            'bufferViews': [{'buffer': 0, 'byteLength': len(data)}],
+            'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': 2, 'type': 'VEC3'}],
+        }
+        with open(self.path, 'wb') as f:
+            f.write(make_glb(gltf, data))
+
+    def import_accessor(self):
+        op = load_op(self.path)
+        op.accessor_cache_dir = self.cache_dir
+        op.accessor_cache = accessor_cache.open_cache(op)
+        return op.get_accessor(0)
+
+    def test_hit_skips_decoding(self):
+        first = self.import_accessor()
+        self.assertNotIsInstance(first, np.memmap)
+
+        create_accessor = buffer.create_accessor
+        buffer.create_accessor = None  # Decoding again would blow up
+        try:
+            second = self.import_accessor()
+        finally:
+            buffer.create_accessor = create_accessor
+        self.assertIsInstance(second, np.memmap)
+        np.testing.assert_array_equal(first, second)
+
+        # Copy-on-write: changing it doesn't touch the cache
+        second[0, 0] = 42
+        np.testing.assert_array_equal(self.import_accessor(), first)
+
+    def test_changed_file_misses(self):
+        self.import_accessor()
+        self.write_glb(7)
+        # Same size; make sure the modification time differs
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.import_accessor()[0].tolist(), [7, 2, 3])
+
+    def test_eviction_removes_least_recently_used(self):
+        cache = accessor_cache.AccessorCache(self.cache_dir, 'a' * 40, size_limit=0)
+        array = np.zeros(100, dtype=np.float32)
+        for idx in range(0, 3):
+            cache.put(idx, array)
+            os.utime(cache.path(idx), (idx, idx))
+        file_size = os.path.getsize(cache.path(0))
+        cache.size_limit = 2 * file_size
+
+        cache.get(0)  # Now the most recently used
+        cache.evict()
+
+        self.assertIsNotNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+        self.assertIsNotNone(cache.get(2))
+
+        cache.size_limit = 0
+        cache.evict()
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_eviction_leaves_other_files_alone(self):
+        # Things in the cache directory that the cache didn't make
+        os.makedirs(os.path.join(self.cache_dir, 'photos', 'empty'))
+        os.makedirs(os.path.join(self.cache_dir, 'b' * 40))
+        others = [
+            os.path.join(self.cache_dir, 'data.npy'),
+            os.path.join(self.cache_dir, 'photos', 'data.npy'),
+            os.path.join(self.cache_dir, 'b' * 40, 'notes.npy'),
+        ]
+        for path in others:
+            with open(path, 'wb') as f:
+                f.write(bytes(1000))
+
+        cache = accessor_cache.AccessorCache(self.cache_dir, 'a' * 40, size_limit=0)
+        cache.put(0, np.zeros(100, dtype=np.float32))
+        cache.evict()
+
+        self.assertIsNone(cache.get(0))
+        self.assertFalse(os.path.exists(cache.dir))
+        for path in others:
+            self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.isdir(os.path.join(self.cache_dir, 'photos', 'empty')))
+
+
+if __name__ == '__main__':
+    unittest.main()
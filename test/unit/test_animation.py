@@ -0,0 +1,74 @@
+import struct
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_glb_op  # noqa: E402
+from io_scene_gltf import animation  # noqa: E402
+
+
+class QuaternionTest(unittest.TestCase):
+    def test_multiply(self):
+        # 90 degrees about Z, twice, is 180 degrees about Z
+        s = np.sqrt(0.5)
+        q = np.array([[s, 0, 0, s]])
+        np.testing.assert_allclose(animation.quaternion_multiply(q, q), [[0, 0, 0, 1]], atol=1e-7)
+
+    def test_inverse_of_rest_cancels(self):
+        rest = np.array([0.5, 0.5, 0.5, 0.5])
+        rest_inv = rest * np.array([1, -1, -1, -1])
+        np.testing.assert_allclose(animation.quaternion_multiply(rest_inv, rest), [1, 0, 0, 0], atol=1e-7)
+
+    def test_make_continuous(self):
+        quats = np.array([[1, 0, 0, 0], [-1, 0, 0, 0], [-1, 0, 0, 0], [1, 0, 0, 0]], dtype=np.float32)
+        self.assertEqual(animation.make_continuous(quats).tolist(), [[1, 0, 0, 0]] * 4)
+
+    def test_quaternion_to_matrix(self):
+        s = np.sqrt(0.5)
+        mat = animation.quaternion_to_matrix(np.array([s, 0, 0, s]))
+        np.testing.assert_allclose(np.dot(mat, [1, 0, 0]), [0, 1, 0], atol=1e-7)
+
+
+class SamplerTest(unittest.TestCase):
+    def make_op(self, times, values):
+        data = struct.pack('<%df' % len(times), *times) + struct.pack('<%df' % len(values), *values)
+        return make_glb_op(
+            data,
+            [
+                {'buffer': 0, 'byteLength': 4 * len(times)},
+                {'buffer': 0, 'byteOffset': 4 * len(times), 'byteLength': 4 * len(values)},
+            ],
+            [
+                {'bufferView': 0, 'componentType': 5126, 'count': len(times), 'type': 'SCALAR'},
+                {'bufferView': 1, 'componentType': 5126, 'count': len(values), 'type': 'SCALAR'},
+            ],
+        )
+
+    def test_linear(self):
+        op = self.make_op([0, 1], [1, 2, 3, 4])
+        (frames, values, interpolation) = animation.decode_sampler(op, {'input': 0, 'output': 1}, 24)
+        self.assertEqual(frames.tolist(), [0, 24])
+        self.assertEqual(values.tolist(), [[1, 2], [3, 4]])
+        self.assertEqual(interpolation, 'LINEAR')
+
+    def test_cubic_spline_drops_tangents(self):
+        op = self.make_op([0, 1], [9, 1, 9, 9, 2, 9])
+        sampler = {'input': 0, 'output': 1, 'interpolation': 'CUBICSPLINE'}
+        (_frames, values, _interpolation) = animation.decode_sampler(op, sampler, 24)
+        self.assertEqual(values.tolist(), [[1], [2]])
+
+
+class RestTransformTest(unittest.TestCase):
+    def test_trs(self):
+        node = {'translation': [1, 2, 3], 'rotation': [0, 0, 1, 0]}
+        (t, q, s) = animation.get_rest_transform(node)
+        self.assertEqual(t.tolist(), [1, 2, 3])
+        self.assertEqual(q.tolist(), [0, 0, 0, 1])
+        self.assertEqual(s.tolist(), [1, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
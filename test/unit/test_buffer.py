@@ -0,0 +1,171 @@
+import mmap
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_glb, make_glb_op, make_op  # noqa: E402
+from io_scene_gltf import buffer  # noqa: E402
+
+
+class ZeroCopyTest(unittest.TestCase):
+    def test_glb_buffer_views_share_file_contents(self):
+        data = struct.pack('<4f', 1, 2, 3, 4)
+        gltf = {
+            'asset': {'version': '2.0'},
+            'buffers': [{'byteLength': len(data)}],
+            'bufferViews': [{'buffer': 0, 'byteOffset': 8, 'byteLength': 8}],
+        }
+        contents = bytearray(make_glb(gltf, data))
+
+        op = make_op(None)
+        op.parse_glb(contents)
+        (view, _stride) = op.get_buffer_view(0)
+
+        self.assertIs(op.glb_buffer.obj, contents)
+        self.assertIs(view.obj, contents)
+        self.assertEqual(struct.unpack('<2f', view), (3, 4))
+
+        # Writing through the file contents must show up in the view
+        bin_start = len(contents) - len(data)
+        contents[bin_start + 8:bin_start + 12] = struct.pack('<f', 42)
+        self.assertEqual(struct.unpack('<2f', view), (42, 4))
+
+
+class MmapTest(unittest.TestCase):
+    def setUp(self):
+        data = struct.pack('<3f', 1, 2, 3)
+        gltf = {
+            'asset': {'version': '2.0'},
+            'buffers': [{'byteLength': len(data)}],
+            'bufferViews': [{'buffer': 0, 'byteLength': len(data)}],
+            'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': 1, 'type': 'VEC3'}],
+        }
+        fd, self.path = tempfile.mkstemp(suffix='.glb')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(make_glb(gltf, data))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def load(self, use_mmap):
+        op = make_op(None)
+        op.filepath = self.path
+        op.use_mmap = use_mmap
+        op.load()
+        return op
+
+    def test_glb_is_mapped(self):
+        op = self.load(use_mmap=True)
+        self.assertIsInstance(op.glb_buffer.obj, mmap.mmap)
+        self.assertEqual(op.get_accessor(0).tolist(), [[1, 2, 3]])
+
+        mm = op.mapped_files[0]
+        op.glb_buffer = None
+        op.buffers = {}
+        op.buffer_views = {}
+        buffer.release_files(op)
+        self.assertTrue(mm.closed)
+        self.assertEqual(op.mapped_files, [])
+
+    def test_without_mmap(self):
+        op = self.load(use_mmap=False)
+        self.assertIsInstance(op.glb_buffer.obj, bytes)
+        self.assertEqual(op.mapped_files, [])
+        self.assertEqual(op.get_accessor(0).tolist(), [[1, 2, 3]])
+
+
+class AccessorTest(unittest.TestCase):
+    def test_vec3_float(self):
+        data = struct.pack('<6f', 1, 2, 3, 4, 5, 6)
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data)}],
+            [{'bufferView': 0, 'componentType': 5126, 'count': 2, 'type': 'VEC3'}],
+        )
+        result = op.get_accessor(0)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertEqual(result.shape, (2, 3))
+        self.assertEqual(result.tolist(), [[1, 2, 3], [4, 5, 6]])
+
+    def test_scalar_is_flat(self):
+        data = struct.pack('<3H', 0, 1, 2)
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data)}],
+            [{'bufferView': 0, 'componentType': 5123, 'count': 3, 'type': 'SCALAR'}],
+        )
+        result = op.get_accessor(0)
+        self.assertEqual(result.dtype, np.uint16)
+        self.assertEqual(result.tolist(), [0, 1, 2])
+
+    def test_byte_stride_and_offset(self):
+        # Two interleaved VEC2 floats, we want the second one.
+        data = struct.pack('<8f', 0, 0, 1, 2, 0, 0, 3, 4)
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data), 'byteStride': 16}],
+            [{'bufferView': 0, 'byteOffset': 8, 'componentType': 5126, 'count': 2, 'type': 'VEC2'}],
+        )
+        self.assertEqual(op.get_accessor(0).tolist(), [[1, 2], [3, 4]])
+
+    def test_normalized(self):
+        data = struct.pack('<4b', 127, -127, -128, 0)
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data)}],
+            [{
+                'bufferView': 0, 'componentType': 5120, 'count': 1,
+                'type': 'VEC4', 'normalized': True,
+            }],
+        )
+        result = op.get_accessor(0)
+        self.assertEqual(result.dtype, np.float32)
+        self.assertEqual(result.tolist(), [[1, -1, -1, 0]])
+
+    def test_mat2_byte_padding(self):
+        # Each column is padded to 4 bytes.
+        data = bytes([1, 2, 0, 0, 3, 4, 0, 0])
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data)}],
+            [{'bufferView': 0, 'componentType': 5121, 'count': 1, 'type': 'MAT2'}],
+        )
+        self.assertEqual(op.get_accessor(0).tolist(), [[1, 2, 3, 4]])
+
+    def test_mat3_short_padding(self):
+        data = struct.pack('<3Hxx3Hxx3Hxx', *range(1, 10))
+        op = make_glb_op(
+            data,
+            [{'buffer': 0, 'byteLength': len(data)}],
+            [{'bufferView': 0, 'componentType': 5123, 'count': 1, 'type': 'MAT3'}],
+        )
+        self.assertEqual(op.get_accessor(0).tolist(), [list(range(1, 10))])
+
+    def test_sparse_without_buffer_view(self):
+        data = struct.pack('<H2x2f', 1, 7, 8)
+        op = make_glb_op(
+            data,
+            [
+                {'buffer': 0, 'byteLength': 2},
+                {'buffer': 0, 'byteOffset': 4, 'byteLength': 8},
+            ],
+            [{
+                'componentType': 5126, 'count': 3, 'type': 'VEC2',
+                'sparse': {
+                    'count': 1,
+                    'indices': {'bufferView': 0, 'componentType': 5123},
+                    'values': {'bufferView': 1},
+                },
+            }],
+        )
+        self.assertEqual(op.get_accessor(0).tolist(), [[0, 0], [7, 8], [0, 0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import load_op  # noqa: E402
+from io_scene_gltf import buffer, datauri  # noqa: E402
+
+
+def data_uri(data, mime='application/octet-stream'):
+    return 'data:%s;base64,%s' % (mime, base64.b64encode(data).decode('ascii'))
+
+
+def random_bytes(size):
+    return np.random.RandomState(0).randint(0, 256, size, dtype=np.uint8).tobytes()
+
+
+class LoadJsonTest(unittest.TestCase):
+    def test_large_payloads_stay_in_contents(self):
+        big = random_bytes(datauri.LAZY_MIN_SIZE)
+        small = b'small'
+        gltf = {
+            'buffers': [{'uri': data_uri(big), 'byteLength': len(big)}, {'uri': data_uri(small)}],
+            'images': [{'uri': data_uri(big, 'image/png')}],
+        }
+        contents = bytearray(json.dumps(gltf).encode('utf-8'))
+        (parsed, lazy_uris) = datauri.load_json(contents)
+
+        self.assertEqual(len(lazy_uris), 2)
+        uri = parsed['buffers'][0]['uri']
+        self.assertIsInstance(uri, datauri.LazyDataURI)
+        self.assertEqual(uri, 'data:application/octet-stream;base64,')
+        self.assertIs(uri.payload.obj, contents)
+        self.assertEqual(parsed['images'][0]['uri'], 'data:image/png;base64,')
+        self.assertNotIsInstance(parsed['buffers'][1]['uri'], datauri.LazyDataURI)
+        self.assertEqual(parsed['buffers'][0]['byteLength'], len(big))
+
+        self.assertEqual(bytes(datauri.decode(uri)), big)
+        self.assertEqual(bytes(datauri.decode(parsed['buffers'][1]['uri'])), small)
+
+        datauri.release(lazy_uris)
+        self.assertIsNone(uri.payload)
+
+    def test_other_strings_are_left_alone(self):
+        big = random_bytes(datauri.LAZY_MIN_SIZE)
+        gltf = {
+            'extras': {'thumbnail': data_uri(big, 'image/png')},
+            'extensions': {'EXT_example': {'uri': data_uri(big)}},
+        }
+        (parsed, lazy_uris) = datauri.load_json(json.dumps(gltf).encode('utf-8'))
+
+        self.assertEqual(parsed['extras'], gltf['extras'])
+        uri = parsed['extensions']['EXT_example']['uri']
+        self.assertEqual(lazy_uris, [uri])
+        self.assertEqual(bytes(datauri.decode(uri)), big)
+
+    def test_chunked_decoding(self):
+        chunk_size = datauri.CHUNK_SIZE
+        datauri.CHUNK_SIZE = 8
+        try:
+            for size in range(0, 20):
+                data = random_bytes(size)
+                payload = base64.b64encode(data)
+                self.assertEqual(bytes(datauri.decode_payload(memoryview(payload))), data)
+                uri = 'data:;base64,' + payload.decode('ascii')
+                self.assertEqual(bytes(datauri.decode(uri)), data)
+        finally:
+            datauri.CHUNK_SIZE = chunk_size
+
+    def test_wrapped_payload(self):
+        chunk_size = datauri.CHUNK_SIZE
+        datauri.CHUNK_SIZE = 8
+        try:
+            data = random_bytes(100)
+            payload = base64.encodebytes(data).decode('ascii')  # Lines of 76 characters
+            self.assertIn('\n', payload)
+            for text in ['data:;base64,' + payload, 'data:;base64, ' + payload.replace('\n', '\r\n ')]:
+                self.assertEqual(bytes(datauri.decode(text)), data)
+            self.assertEqual(bytes(datauri.decode_payload(memoryview(payload.encode('ascii')))), data)
+        finally:
+            datauri.CHUNK_SIZE = chunk_size
+
+    def test_not_base64(self):
+        self.assertIsNone(datauri.decode('data:text/plain,hello'))
+
+
+class DataURICacheTest(unittest.TestCase):
+    def test_decoded_once(self):
+        decode = datauri.decode
+        calls = []
+
+        def counting_decode(uri):
+            calls.append(uri)
+            return decode(uri)
+        datauri.decode = counting_decode
+        try:
+            cache = datauri.DataURICache()
+            uri = data_uri(b'shared')
+            results = [cache.decode(uri), cache.decode(data_uri(b'shared'))]
+            # Lazy URIs are told apart by their offset
+            payload = memoryview(base64.b64encode(b'lazy'))
+            lazy = [datauri.LazyDataURI('data:;base64,', payload, offset) for offset in (10, 10, 20)]
+            results += [cache.decode(uri) for uri in lazy]
+
+            cache.release(uri)
+            results.append(cache.decode(uri))
+        finally:
+            datauri.decode = decode
+
+        self.assertEqual(len(calls), 4)
+        self.assertIs(results[0], results[1])
+        self.assertIs(results[2], results[3])
+        self.assertIsNot(results[2], results[4])
+        self.assertEqual(bytes(results[2]), b'lazy')
+        self.assertIsNot(results[5], results[0])
+        self.assertEqual(results[5], results[0])
+
+    def test_errors_are_raised_every_time(self):
+        cache = datauri.DataURICache()
+        for _ in range(0, 2):
+            with self.assertRaises(Exception):
+                cache.decode('data:;base64,abc')
+
+
+class LoadTest(unittest.TestCase):
+    def test_import_with_lazy_buffer(self):
+        positions = np.arange(0, 3 * 10000, dtype='<f4')
+        gltf = {
+            'asset': {'version': '2.0'},
+            'buffers': [{'uri': data_uri(positions.tobytes()), 'byteLength': positions.nbytes}],
+            'bufferViews': [{'buffer': 0, 'byteLength': positions.nbytes}],
+            'accessors': [{'bufferView': 0, 'componentType': 5126, 'count': 10000, 'type': 'VEC3'}],
+        }
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'scene.gltf')
+            with open(path, 'w') as f:
+                json.dump(gltf, f)
+            op = load_op(path, use_mmap=True)
+            self.assertEqual(len(op.lazy_data_uris), 1)
+            np.testing.assert_array_equal(op.get_accessor(0).reshape(-1), positions)
+            op.buffers = {}
+            op.buffer_views = {}
+            datauri.release(op.lazy_data_uris)
+            buffer.release_files(op)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import load_op  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gltf_generator  # noqa: E402
+from io_scene_gltf import mesh  # noqa: E402
+
+
+class GeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def generate(self, filename, **params):
+        path = os.path.join(self.tmp_dir, filename)
+        stats = gltf_generator.generate(path, **params)
+        return (path, stats)
+
+    def test_glb_and_gltf_agree(self):
+        params = dict(nodes=20, meshes=3, primitives=2, vertices=50, textures=2, skins=1, animation_length=5)
+        (glb_path, _) = self.generate('scene.glb', **params)
+        (gltf_path, _) = self.generate('scene.gltf', **params)
+        glb = load_op(glb_path)
+        gltf = load_op(gltf_path)
+        self.assertEqual(glb.gltf['nodes'], gltf.gltf['nodes'])
+        for i in range(0, len(glb.gltf['accessors'])):
+            np.testing.assert_array_equal(glb.get_accessor(i), gltf.get_accessor(i))
+
+    def test_deterministic(self):
+        (a, _) = self.generate('a.glb', nodes=10, vertices=30, seed=5)
+        (b, _) = self.generate('b.glb', nodes=10, vertices=30, seed=5)
+        (c, _) = self.generate('c.glb', nodes=10, vertices=30, seed=6)
+        with open(a, 'rb') as fa, open(b, 'rb') as fb, open(c, 'rb') as fc:
+            (a, b, c) = (fa.read(), fb.read(), fc.read())
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_decodes(self):
+        (path, stats) = self.generate('scene.glb', nodes=12, meshes=2, primitives=3, vertices=40, skins=2)
+        op = load_op(path)
+        self.assertEqual(stats['nodes'], 12)
+        total = 0
+        for m in op.gltf['meshes']:
+            for primitive in m['primitives']:
+                prim = mesh.decode_primitive(op, primitive)
+                self.assertEqual(prim['POSITION'].shape, (40, 3))
+                self.assertEqual(prim['JOINTS_0'].shape, (40, 4))
+                self.assertLess(prim['JOINTS_0'].max(), 8)
+                self.assertTrue(np.allclose(prim['WEIGHTS_0'].sum(axis=1), 1, atol=1e-5))
+                total += len(prim['POSITION'])
+        self.assertEqual(total, stats['vertices'])
+
+    def test_depth(self):
+        def walk(nodes, roots):
+            """Return (depth, number of nodes reached) of a hierarchy."""
+            (depth, reached) = (0, 0)
+            level = roots
+            while level:
+                depth += 1
+                reached += len(level)
+                level = [c for i in level for c in nodes[i].get('children', [])]
+            return (depth, reached)
+
+        for (num_nodes, depth) in [(10, 1), (10, 3), (50, 50)]:
+            (path, _) = self.generate('scene.gltf', nodes=num_nodes, depth=depth, meshes=0)
+            gltf = load_op(path).gltf
+            self.assertEqual(walk(gltf['nodes'], gltf['scenes'][0]['nodes']), (depth, num_nodes))
+
+    def test_png(self):
+        png = gltf_generator.make_png(16, 0)
+        self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
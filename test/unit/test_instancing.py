@@ -0,0 +1,56 @@
+import math
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_op  # noqa: E402
+from io_scene_gltf import instancing  # noqa: E402
+
+
+class InstanceTriangleTest(unittest.TestCase):
+    def test_triangles_encode_transforms(self):
+        rng = np.random.RandomState(0)
+        n = 20
+        translations = rng.uniform(-5, 5, (n, 3))
+        rotations = rng.normal(size=(n, 4))
+        rotations /= np.linalg.norm(rotations, axis=1)[:, np.newaxis]
+        scales = rng.uniform(0.1, 3, n)
+
+        corners = instancing.instance_triangles(translations, rotations, scales)
+        matrices = instancing.quaternions_to_matrices(rotations)
+        (v1, v2, v3) = (corners[:, 0], corners[:, 1], corners[:, 2])
+
+        # What DupliFaces reads back from the faces
+        center = corners.mean(axis=1)
+        cross = np.cross(v2 - v1, v3 - v1)
+        area = np.linalg.norm(cross, axis=1) / 2
+        normal = cross / (2 * area[:, np.newaxis])
+        edge = (v2 - v1) / np.linalg.norm(v2 - v1, axis=1)[:, np.newaxis]
+
+        np.testing.assert_allclose(center, translations, atol=1e-9)
+        np.testing.assert_allclose(np.sqrt(area) * instancing.DUPLI_FACES_SCALE, scales)
+        np.testing.assert_allclose(normal, matrices[:, :, 2], atol=1e-9)
+        np.testing.assert_allclose(edge, matrices[:, :, 0], atol=1e-9)
+
+    def test_quaternions_to_matrices(self):
+        # 90 degrees around Z
+        s = math.sqrt(0.5)
+        m = instancing.quaternions_to_matrices(np.array([[0, 0, s, s]]))
+        np.testing.assert_allclose(m[0], [[0, -1, 0], [1, 0, 0], [0, 0, 1]], atol=1e-12)
+
+    def test_decode_defaults(self):
+        gltf = {
+            'accessors': [{'componentType': 5126, 'count': 2, 'type': 'VEC3'}],
+        }
+        op = make_op(gltf)
+        (t, r, s) = instancing.decode_instances(op, {'attributes': {'TRANSLATION': 0}})
+        self.assertEqual(t.tolist(), [[0, 0, 0], [0, 0, 0]])
+        self.assertEqual(r.tolist(), [[0, 0, 0, 1], [0, 0, 0, 1]])
+        self.assertEqual(s.tolist(), [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import base64
+import unittest
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_glb_op, make_op  # noqa: E402
+from io_scene_gltf import liveness, mesh  # noqa: E402
+
+
+def accessor(view):
+    return {'bufferView': view, 'componentType': 5126, 'count': 1, 'type': 'VEC3'}
+
+
+def make_liveness_op():
+    op = make_glb_op(
+        bytes(48),
+        [{'buffer': 0, 'byteOffset': 12 * i, 'byteLength': 12} for i in range(0, 4)],
+        [accessor(i) for i in range(0, 4)],
+        meshes=[
+            {'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1}}]},
+            {'primitives': [{'attributes': {'POSITION': 0, 'TANGENT': 2}}]},
+            # Same content as mesh 0, so never built
+            {'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1}}]},
+        ],
+        images=[{'bufferView': 3, 'mimeType': 'image/png'}],
+    )
+    mesh.find_shared_meshes(op)
+    op.uses = liveness.count_uses(op)
+    return op
+
+
+class LivenessTest(unittest.TestCase):
+    def test_counts(self):
+        op = make_liveness_op()
+        self.assertEqual(op.uses.counts, {
+            ('accessor', 0): 2,
+            ('accessor', 1): 1,
+            ('accessor', 2): 1,
+            ('bufferView', 0): 1,
+            ('bufferView', 1): 1,
+            ('bufferView', 2): 1,
+            ('bufferView', 3): 1,
+            ('buffer', 0): 4,
+        })
+
+    def test_only_a_duplicate_is_reachable(self):
+        op = make_liveness_op()
+        op.reachable = {'meshes': {2}, 'animations': set(), 'nodes': set(), 'images': set()}
+        uses = liveness.count_uses(op)
+        # Mesh 2 is built as mesh 0
+        self.assertEqual(uses.used_by[('mesh', 0)], [('accessor', 0), ('accessor', 1)])
+        self.assertNotIn(('mesh', 1), uses.used_by)
+
+    def test_evicted_after_last_user(self):
+        op = make_liveness_op()
+        for idx in (0, 1):
+            mesh.decode_primitive(op, op.gltf['meshes'][idx]['primitives'][0])
+        op.get_buffer_view(3)
+        self.assertEqual(sorted(op.accessors), [0, 1])
+
+        op.uses.release(op, ('mesh', 0))
+        self.assertEqual(sorted(op.accessors), [0])
+        self.assertEqual(sorted(op.buffer_views), [0, 3])
+        self.assertEqual(sorted(op.buffers), [0])
+
+        op.uses.release(op, ('mesh', 1))
+        self.assertEqual(op.accessors, {})
+        self.assertEqual(sorted(op.buffer_views), [3])
+        self.assertEqual(sorted(op.buffers), [0])
+
+        op.uses.release(op, ('image', 0))
+        self.assertEqual(op.buffer_views, {})
+        self.assertEqual(op.buffers, {})
+        self.assertEqual(op.uses.counts, {})
+
+    def test_released_data_is_loaded_again(self):
+        op = make_liveness_op()
+        first = op.get_accessor(0)
+        op.uses.release(op, ('mesh', 0))
+        op.uses.release(op, ('mesh', 1))
+        self.assertEqual(op.get_accessor(0).tolist(), first.tolist())
+
+    def test_data_uri_is_dropped_with_its_buffer(self):
+        uri = 'data:application/octet-stream;base64,' + base64.b64encode(bytes(12)).decode('ascii')
+        gltf = {
+            'buffers': [{'byteLength': 12, 'uri': uri}],
+            'bufferViews': [{'buffer': 0, 'byteLength': 12}],
+            'accessors': [accessor(0)],
+            'meshes': [{'primitives': [{'attributes': {'POSITION': 0}}]}],
+        }
+        op = make_op(gltf)
+        mesh.find_shared_meshes(op)
+        op.uses = liveness.count_uses(op)
+        op.get_accessor(0)
+        self.assertEqual(len(op.decoded_data_uris.results), 1)
+
+        op.uses.release(op, ('mesh', 0))
+        self.assertEqual(op.buffers, {})
+        self.assertEqual(op.decoded_data_uris.results, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import base64
+import os
+import shutil
+import tempfile
+import unittest
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_glb_op  # noqa: E402
+from io_scene_gltf import material  # noqa: E402
+
+
+class ImageCacheTest(unittest.TestCase):
+    def setUp(self):
+        png = b'\x89PNG\r\n\x1a\nnot really a png'
+        data_uri = 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+        self.op = make_glb_op(
+            png,
+            [{'buffer': 0, 'byteLength': len(png)}],
+            [],
+            images=[
+                {'uri': data_uri},
+                {'uri': data_uri},
+                {'bufferView': 0, 'mimeType': 'image/png'},
+                {'uri': 'a.png'},
+                {'uri': './a.png'},
+            ],
+            textures=[{'source': idx} for idx in range(0, 5)],
+            materials=[
+                {'pbrMetallicRoughness': {'baseColorTexture': {'index': idx}}}
+                for idx in range(0, 5)
+            ],
+            meshes=[{'primitives': [{'attributes': {}, 'material': idx} for idx in range(0, 5)]}],
+        )
+
+        self.op.base_path = tempfile.mkdtemp()
+        with open(os.path.join(self.op.base_path, 'a.png'), 'wb') as f:
+            f.write(png)
+
+    def tearDown(self):
+        shutil.rmtree(self.op.base_path)
+
+    def test_same_index_is_reused(self):
+        image = self.op.get_image(0)
+        self.assertIs(self.op.get_image(0), image)
+        self.assertEqual(self.op.image_cache_stats, {'hits': 1, 'misses': 1})
+
+    def test_same_contents_are_reused(self):
+        image = self.op.get_image(0)
+        self.assertIs(self.op.get_image(1), image)
+        self.assertIs(self.op.get_image(2), image)
+        self.assertEqual(self.op.image_cache_stats, {'hits': 2, 'misses': 1})
+        # The decoded data URI isn't kept once the image is made
+        self.assertEqual(self.op.decoded_data_uris.results, {})
+
+    def test_same_path_is_reused(self):
+        image = self.op.get_image(3)
+        self.assertIs(self.op.get_image(4), image)
+        self.assertEqual(self.op.image_cache_stats, {'hits': 1, 'misses': 1})
+
+    def test_prefetch(self):
+        material.prefetch_images(self.op)
+        self.assertEqual(sorted(self.op.image_prefetch), [0, 1, 2, 3, 4])
+        for idx in range(0, 5):
+            self.op.get_image(idx)
+        self.assertEqual(self.op.image_prefetch, {})
+        self.assertEqual(self.op.image_cache_stats, {'hits': 3, 'misses': 2})
+
+    def test_prefetch_holds_few_images(self):
+        max_held = material.PREFETCH_MAX_HELD
+        material.PREFETCH_MAX_HELD = 1
+        try:
+            material.prefetch_images(self.op)
+            results = [self.op.image_prefetch[idx].result() for idx in range(0, 5)]
+        finally:
+            material.PREFETCH_MAX_HELD = max_held
+        # Only one embedded image was read ahead; external files never are
+        self.assertEqual(sum(result is not None for result in results[:3]), 1)
+        self.assertEqual([result[1] for result in results[3:]], [None, None])
+
+        for idx in range(0, 5):
+            self.op.get_image(idx)
+        self.assertEqual(self.op.image_cache_stats, {'hits': 3, 'misses': 2})
+        # Every slot was given back
+        self.assertTrue(self.op.image_prefetch_slots.acquire(blocking=False))
+
+    def test_prefetch_only_used(self):
+        # An image no material uses
+        self.op.gltf['images'].append({'uri': 'a.png'})
+        material.prefetch_images(self.op)
+        self.assertEqual(sorted(self.op.image_prefetch), [0, 1, 2, 3, 4])
+
+    def test_prefetch_only_reachable(self):
+        self.op.reachable = {'images': {1, 3}}
+        material.prefetch_images(self.op)
+        self.assertEqual(sorted(self.op.image_prefetch), [1, 3])
+
+    def test_unreadable_image(self):
+        self.op.gltf['images'].append({'uri': 'missing.png'})
+        self.assertIsNone(self.op.get_image(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
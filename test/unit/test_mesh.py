@@ -0,0 +1,119 @@
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from fixtures import make_op  # noqa: E402
+from io_scene_gltf import mesh  # noqa: E402
+
+
+def make_prims():
+    first = {
+        'POSITION': np.zeros((3, 3), dtype=np.float32),
+        'TEXCOORD_0': np.array([[0, 1], [2, 3], [4, 5]], dtype=np.float32),
+        'edges': np.zeros((0, 2), dtype=np.int32),
+        'faces': np.array([[0, 1, 2]], dtype=np.int32),
+        'vert_offset': 0,
+    }
+    second = {
+        'POSITION': np.zeros((4, 3), dtype=np.float32),
+        'edges': np.zeros((0, 2), dtype=np.int32),
+        'faces': np.array([[0, 1, 2], [2, 1, 3]], dtype=np.int32),
+        'vert_offset': 3,
+    }
+    return [first, second]
+
+
+class MergeTest(unittest.TestCase):
+    def test_concat_offsets_indices(self):
+        faces = mesh.concat_elems(make_prims(), 'faces', 3)
+        self.assertEqual(faces.tolist(), [[0, 1, 2], [3, 4, 5], [5, 4, 6]])
+
+    def test_concat_nothing(self):
+        self.assertEqual(mesh.concat_elems([], 'edges', 2).shape, (0, 2))
+
+    def test_missing_attribute_gets_default(self):
+        uvs = mesh.merge_attribute(make_prims(), 'TEXCOORD_0', 7, 2, 0)
+        self.assertEqual(uvs.tolist(), [[0, 1], [2, 3], [4, 5]] + [[0, 0]] * 4)
+
+    def test_attribute_is_truncated(self):
+        prims = make_prims()
+        prims[1]['COLOR_0'] = np.full((4, 4), 0.5, dtype=np.float32)
+        colors = mesh.merge_attribute(prims, 'COLOR_0', 7, 3, 1)
+        self.assertEqual(colors.tolist(), [[1, 1, 1]] * 3 + [[0.5, 0.5, 0.5]] * 4)
+
+
+class SkinWeightTest(unittest.TestCase):
+    def test_groups(self):
+        joints = np.array([[0, 1, 0, 0], [1, 0, 0, 0], [1, 2, 0, 0]], dtype=np.int32)
+        weights = np.array([[0.5, 0.5, 0, 0], [1, 0, 0, 0], [0.5, 0.5, 0, 0]], dtype=np.float32)
+        groups = mesh.skin_weight_groups([joints], [weights])
+        groups = [(joint, weight, verts.tolist()) for joint, weight, verts in groups]
+        self.assertEqual(groups, [
+            (0, 0.5, [0]),
+            (1, 0.5, [0, 2]),
+            (1, 1.0, [1]),
+            (2, 0.5, [2]),
+        ])
+
+    def test_second_set_and_duplicates(self):
+        joints0 = np.array([[3, 0, 0, 0]], dtype=np.int32)
+        weights0 = np.array([[0.25, 0, 0, 0]], dtype=np.float32)
+        joints1 = np.array([[3, 4, 0, 0]], dtype=np.int32)
+        weights1 = np.array([[0.25, 0.5, 0, 0]], dtype=np.float32)
+        groups = mesh.skin_weight_groups([joints0, joints1], [weights0, weights1])
+        groups = [(joint, weight, verts.tolist()) for joint, weight, verts in groups]
+        self.assertEqual(groups, [(3, 0.5, [0]), (4, 0.5, [0])])
+
+    def test_weights_are_exact(self):
+        joints = np.array([[0, 1, 0, 0], [0, 1, 0, 0]], dtype=np.int32)
+        weights = np.array([[0.9999, 0.0001, 0, 0], [0.9998, 0.0002, 0, 0]], dtype=np.float32)
+        groups = mesh.skin_weight_groups([joints], [weights])
+        groups = [(joint, weight, verts.tolist()) for joint, weight, verts in groups]
+        self.assertEqual(groups, [
+            (0, float(weights[1, 0]), [1]),
+            (0, float(weights[0, 0]), [0]),
+            (1, float(weights[0, 1]), [0]),
+            (1, float(weights[1, 1]), [1]),
+        ])
+
+    def test_no_weights(self):
+        joints = np.zeros((2, 4), dtype=np.int32)
+        weights = np.zeros((2, 4), dtype=np.float32)
+        self.assertEqual(mesh.skin_weight_groups([joints], [weights]), [])
+
+
+class SharedMeshTest(unittest.TestCase):
+    def test_same_content_shares(self):
+        def primitive(position, material=None):
+            p = {'attributes': {'POSITION': position, 'NORMAL': 1}, 'indices': 2}
+            if material is not None:
+                p['material'] = material
+            return p
+        meshes = [
+            {'name': 'a', 'primitives': [primitive(0)]},
+            {'name': 'b', 'primitives': [primitive(0)]},
+            {'primitives': [primitive(0, material=0)]},
+            {'primitives': [primitive(3)]},
+            {'primitives': [primitive(0, material=0)]},
+            {'primitives': [primitive(0)], 'weights': [0.5]},
+            {'primitives': [primitive(0), primitive(0)]},
+        ]
+        op = make_op({'meshes': meshes})
+        mesh.find_shared_meshes(op)
+        self.assertEqual(op.mesh_instance_of, [0, 0, 2, 3, 2, 5, 6])
+
+    def test_extras_that_are_not_objects(self):
+        meshes = [
+            {'primitives': [{'attributes': {'POSITION': 0}}], 'extras': extras}
+            for extras in ['a string', 3, ['a', 'list'], None, {'targetNames': 'a'}]
+        ]
+        op = make_op({'meshes': meshes})
+        mesh.find_shared_meshes(op)
+        self.assertEqual(op.mesh_instance_of, [0, 0, 0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
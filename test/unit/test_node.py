@@ -0,0 +1,62 @@
+import math
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from io_scene_gltf import node  # noqa: E402
+
+
+def chain(n):
+    nodes = [{'children': [i + 1], 'translation': [1, 0, 0]} for i in range(0, n - 1)]
+    nodes.append({'translation': [1, 0, 0]})
+    return nodes
+
+
+class TraverseTest(unittest.TestCase):
+    def test_levels(self):
+        nodes = [{'children': [1, 2]}, {'children': [3]}, {}, {}, {}]
+        (idxs, parents, roots) = node.traverse(nodes, [0, 4])
+        self.assertEqual(idxs.tolist(), [0, 4, 1, 2, 3])
+        self.assertEqual(parents.tolist(), [-1, -1, 0, 0, 1])
+        self.assertEqual(roots.tolist(), [0, 4, 0, 0, 0])
+
+    def test_deep_chain(self):
+        # Deeper than the recursion limit
+        n = 50000
+        nodes = chain(n)
+        (idxs, parents, _) = node.traverse(nodes, [0])
+        self.assertEqual(len(idxs), n)
+        world = node.world_matrices(nodes, idxs, parents)
+        self.assertEqual(world[:, 0, 3].tolist(), list(range(1, n + 1)))
+
+
+class MatrixTest(unittest.TestCase):
+    def test_trs(self):
+        s = math.sqrt(0.5)
+        nodes = [{
+            'translation': [1, 2, 3],
+            'rotation': [0, 0, s, s],  # 90 degrees around Z
+            'scale': [2, 3, 4],
+        }]
+        expected = np.array([
+            [0, -3, 0, 1],
+            [2, 0, 0, 2],
+            [0, 0, 4, 3],
+            [0, 0, 0, 1],
+        ])
+        np.testing.assert_allclose(node.local_matrices(nodes)[0], expected, atol=1e-12)
+
+    def test_world_is_parent_times_local(self):
+        m = [2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 2, 0, 5, 0, 0, 1]  # column-major
+        nodes = [{'matrix': m, 'children': [1]}, {'translation': [1, 1, 1]}]
+        (idxs, parents, _) = node.traverse(nodes, [0])
+        world = node.world_matrices(nodes, idxs, parents)
+        self.assertEqual(world[1, :3, 3].tolist(), [7, 2, 2])
+        self.assertEqual(np.diag(world[1]).tolist(), [2, 2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
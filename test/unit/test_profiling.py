@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import blender_stub
+blender_stub.install()
+
+from io_scene_gltf import profiling  # noqa: E402
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_disabled_does_nothing(self):
+        profiler = profiling.Profiler()
+        with profiler.stage('load'):
+            pass
+        profiler.count('accessorsDecoded')
+        self.assertEqual(profiler.stages, {})
+        self.assertEqual(profiler.counters, {})
+
+    def test_report(self):
+        profiler = profiling.Profiler(enabled=True, use_cprofile=True)
+        profiler.start()
+        for _ in range(0, 2):
+            with profiler.stage('meshes'):
+                with profiler.stage('accessors'):
+                    profiler.count('bytesDecoded', 12)
+        profiler.stop()
+
+        path = os.path.join(self.dir, 'profile.json')
+        profiler.write(path)
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertEqual(list(report['stages']), ['accessors', 'meshes'])
+        self.assertEqual(report['stages']['meshes']['calls'], 2)
+        self.assertGreaterEqual(
+            report['stages']['meshes']['timeElapsed'],
+            report['stages']['accessors']['timeElapsed'],
+        )
+        self.assertEqual(report['counters'], {'bytesDecoded': 24})
+        self.assertTrue(os.path.exists(path + '.prof'))
+
+    def test_self_time_leaves_out_inner_stages(self):
+        profiler = profiling.Profiler(enabled=True)
+        with profiler.stage('objects'):
+            with profiler.stage('meshes'):
+                time.sleep(0.05)
+            time.sleep(0.01)
+        (objects, meshes) = (profiler.stages['objects'], profiler.stages['meshes'])
+
+        self.assertGreaterEqual(objects['timeElapsed'], 0.06)
+        self.assertLess(objects['selfTime'], 0.04)
+        self.assertGreaterEqual(objects['selfTime'], 0.01)
+        self.assertEqual(meshes['selfTime'], meshes['timeElapsed'])
+        self.assertAlmostEqual(objects['selfTime'] + meshes['selfTime'], objects['timeElapsed'])
+
+    def test_compare_stages(self):
+        def report(**self_times):
+            return {'stages': {
+                name: {'timeElapsed': 0.0, 'selfTime': t, 'calls': 1}
+                for name, t in self_times.items()
+            }}
+        old = report(objects=1.0, meshes=2.0, accessors=1.0)
+        new = report(objects=1.1, meshes=2.0, images=0.5)
+        self.assertEqual(profiling.compare_stages(old, new), [
+            ('images', 0.0, 0.5),
+            ('objects', 1.0, 1.1),
+            ('meshes', 2.0, 2.0),
+            ('accessors', 1.0, 0.0),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+import blender_stub
+blender_stub.install()
+
+from io_scene_gltf import reachability  # noqa: E402
+
+
+GLTF = {
+    'scenes': [{'nodes': [0]}, {'nodes': [3]}],
+    'nodes': [
+        {'children': [1, 2]},
+        {'mesh': 0, 'skin': 0},
+        {'camera': 0},
+        {'mesh': 1, 'children': [4]},
+        {'mesh': 2},
+    ],
+    'meshes': [
+        {'primitives': [{'attributes': {}, 'material': 0}, {'attributes': {}}]},
+        {'primitives': [{'attributes': {}, 'material': 1}]},
+        {'primitives': [{'attributes': {}, 'material': 1}]},
+    ],
+    'materials': [
+        {
+            'pbrMetallicRoughness': {'baseColorTexture': {'index': 0}},
+            'normalTexture': {'index': 1},
+        },
+        {
+            'extensions': {
+                'KHR_materials_pbrSpecularGlossiness': {'diffuseTexture': {'index': 2}},
+            },
+        },
+    ],
+    'textures': [{'source': 0}, {'source': 1}, {'source': 1}],
+    'images': [{'uri': 'a.png'}, {'uri': 'b.png'}],
+    'skins': [{'joints': [0]}],
+    'animations': [
+        {'channels': [{'target': {'node': 1, 'path': 'rotation'}}]},
+        {'channels': [{'target': {'node': 4, 'path': 'rotation'}}]},
+    ],
+}
+
+
+class ReachabilityTest(unittest.TestCase):
+    def test_first_scene(self):
+        reachable = reachability.find_reachable(GLTF, 0)
+        self.assertEqual(reachable, {
+            'nodes': {0, 1, 2},
+            'meshes': {0},
+            'cameras': {0},
+            'skins': {0},
+            'materials': {0},
+            'textures': {0, 1},
+            'images': {0, 1},
+            'animations': {0},
+        })
+
+    def test_second_scene(self):
+        reachable = reachability.find_reachable(GLTF, 1)
+        self.assertEqual(reachable['nodes'], {3, 4})
+        self.assertEqual(reachable['meshes'], {1, 2})
+        self.assertEqual(reachable['materials'], {1})
+        self.assertEqual(reachable['textures'], {2})
+        self.assertEqual(reachable['images'], {1})
+        self.assertEqual(reachable['skins'], set())
+        self.assertEqual(reachable['animations'], {1})
+
+
+if __name__ == '__main__':
+    unittest.main()
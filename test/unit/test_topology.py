@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+import blender_stub
+blender_stub.install()
+
+from io_scene_gltf import topology  # noqa: E402
+
+
+def idx(*xs):
+    return np.array(xs, dtype=np.uint16)
+
+
+class TopologyTest(unittest.TestCase):
+    def assertElems(self, elems, expected, size):
+        self.assertEqual(elems.dtype, np.int32)
+        self.assertEqual(elems.shape, (len(expected), size))
+        self.assertEqual(elems.tolist(), [list(e) for e in expected])
+
+    def test_points(self):
+        (edges, faces) = topology.primitive_topology(0, idx(0, 1, 2))
+        self.assertElems(edges, [], 2)
+        self.assertElems(faces, [], 3)
+
+    def test_lines(self):
+        self.assertElems(topology.lines(idx(0, 1, 2, 3, 4)), [(0, 1), (2, 3)], 2)
+
+    def test_line_strip(self):
+        self.assertElems(topology.line_strip(idx(0, 1, 2)), [(0, 1), (1, 2)], 2)
+        self.assertElems(topology.line_strip(idx(0)), [], 2)
+
+    def test_line_loop(self):
+        self.assertElems(topology.line_loop(idx(0, 1, 2)), [(0, 1), (1, 2), (2, 0)], 2)
+
+    def test_triangles(self):
+        faces = topology.triangles(idx(0, 1, 2, 2, 1, 3, 4))
+        self.assertElems(faces, [(0, 1, 2), (2, 1, 3)], 3)
+
+    def test_triangle_strip_winding(self):
+        faces = topology.triangle_strip(idx(0, 1, 2, 3, 4))
+        self.assertElems(faces, [(0, 1, 2), (1, 3, 2), (2, 3, 4)], 3)
+
+    def test_triangle_strip_drops_degenerates(self):
+        # Two strips joined by repeating the last and first vertices
+        faces = topology.triangle_strip(idx(0, 1, 2, 2, 3, 3, 4, 5))
+        self.assertElems(faces, [(0, 1, 2), (3, 5, 4)], 3)
+
+    def test_triangle_fan(self):
+        faces = topology.triangle_fan(idx(0, 1, 2, 3, 4))
+        self.assertElems(faces, [(0, 1, 2), (0, 2, 3), (0, 3, 4)], 3)
+        self.assertElems(topology.triangle_fan(idx(0, 1)), [], 3)
+
+    def test_dispatch(self):
+        indices = idx(0, 1, 2, 3)
+        self.assertEqual(topology.primitive_topology(1, indices)[0].tolist(), [[0, 1], [2, 3]])
+        self.assertEqual(len(topology.primitive_topology(2, indices)[0]), 4)
+        self.assertEqual(len(topology.primitive_topology(3, indices)[0]), 3)
+        self.assertEqual(len(topology.primitive_topology(4, indices)[1]), 1)
+        self.assertEqual(len(topology.primitive_topology(5, indices)[1]), 2)
+        self.assertEqual(len(topology.primitive_topology(6, indices)[1]), 2)
+        with self.assertRaises(Exception):
+            topology.primitive_topology(7, indices)
+
+
+if __name__ == '__main__':
+    unittest.main()